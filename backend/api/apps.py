@@ -1,6 +1,17 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals, tasks  # noqa: F401
+        if settings.REQUEST_PROFILING or settings.METRICS_ENABLED:
+            from .profiling import install_profiler
+            connection_created.connect(install_profiler)
+        if settings.REQUEST_PROFILING:
+            from .profiling import instrument_serializers
+            instrument_serializers()
@@ -0,0 +1,316 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.paginator import InvalidPage
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import close_old_connections
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+from recipes.constant import User
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from .conditional import RecipeValidators
+from .managers import RelatedObjectManager
+from .pagination import RecipeCursorPagination, get_recipes_limit
+from .search import ingredient_index
+from .serializers import SubscrimeSerializer
+from .views import CustomUserViewSet, IngredientViewSet, RecipeViewSet
+
+EXECUTOR = ThreadPoolExecutor(
+    max_workers=settings.ASYNC_DB_POOL_SIZE,
+    thread_name_prefix='async-db'
+)
+
+
+def call_with_connection(func):
+    """Поток пула держит свое соединение и сам закрывает устаревшее"""
+    close_old_connections()
+    try:
+        return func()
+    finally:
+        close_old_connections()
+
+
+async def in_pool(*calls):
+    """Выполняет независимые синхронные вызовы параллельно в пуле.
+
+    Число одновременных запросов к базе ограничено размером пула,
+    сколько бы клиентов ни ждало ответа.
+    """
+    loop = asyncio.get_running_loop()
+    return await asyncio.gather(*(
+        loop.run_in_executor(
+            EXECUTOR,
+            contextvars.copy_context().run,
+            call_with_connection,
+            call
+        )
+        for call in calls
+    ))
+
+
+class AsyncReadView:
+    """Асинхронный GET поверх вьюсета DRF.
+
+    Аутентификация, права, обработка ошибок и рендеринг берутся из
+    вьюсета. Остальные методы и неподдерживаемые варианты запроса
+    отдаются обычному синхронному вьюсету. Подкласс задает viewset,
+    actions и корутину get(), которая возвращает Response.
+    """
+    viewset = None
+    actions = None
+    detail = False
+
+    def __init__(self, request, kwargs):
+        self.view = self.viewset(
+            action_map=self.actions,
+            **self.initkwargs()
+        )
+        self.view.args = ()
+        self.view.kwargs = kwargs
+        self.request = self.view.initialize_request(request, **kwargs)
+        self.view.request = self.request
+        self.view.headers = self.view.default_response_headers
+        self.kwargs = kwargs
+
+    @classmethod
+    def initkwargs(cls):
+        """Как в роутере: права и прочее из @action(...) вьюсета"""
+        return {
+            'detail': cls.detail,
+            **getattr(getattr(cls.viewset, cls.actions['get']), 'kwargs', {}),
+        }
+
+    @classmethod
+    def as_view(cls):
+        sync_view = cls.viewset.as_view(cls.actions, **cls.initkwargs())
+
+        async def view(request, **kwargs):
+            if request.method == 'GET' and cls.supports(request):
+                return await cls(request, kwargs).dispatch()
+            return await sync_to_async(sync_view)(request, **kwargs)
+
+        view.csrf_exempt = True
+        view.cls = sync_view.cls
+        view.actions = sync_view.actions
+        return view
+
+    @classmethod
+    def supports(cls, request):
+        return True
+
+    async def dispatch(self):
+        try:
+            await in_pool(lambda: self.view.initial(self.request))
+            response = await self.get()
+        except Exception as exc:
+            response = self.view.handle_exception(exc)
+        return self.view.finalize_response(self.request, response)
+
+    def paginate(self, queryset):
+        """Номер и размер страницы без запроса к базе"""
+        paginator = self.view.paginator
+        page_size = paginator.get_page_size(self.request)
+        number = self.request.query_params.get(
+            paginator.page_query_param,
+            1
+        )
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise NotFound(paginator.invalid_page_message.format(
+                page_number=number,
+                message='Номер страницы должен быть числом'
+            ))
+        bottom = (max(number, 1) - 1) * page_size
+        return number, queryset[bottom:bottom + page_size], page_size
+
+    def build_page(self, rows, count, number, page_size):
+        """Страница DRF по уже загруженным строкам и COUNT(*)"""
+        paginator = self.view.paginator
+        django_paginator = DjangoPaginator([], page_size)
+        django_paginator.count = count
+        try:
+            number = django_paginator.validate_number(number)
+        except InvalidPage as exc:
+            raise NotFound(paginator.invalid_page_message.format(
+                page_number=number,
+                message=str(exc)
+            ))
+        paginator.page = django_paginator.page(number)
+        paginator.page.object_list = rows
+        paginator.request = self.request
+        return paginator.page
+
+
+class RecipeListView(AsyncReadView):
+    viewset = RecipeViewSet
+    actions = {'get': 'list', 'post': 'create'}
+
+    @classmethod
+    def supports(cls, request):
+        return RecipeCursorPagination.cursor_query_param not in request.GET
+
+    def filter(self):
+        return self.view.filter_queryset(Recipe.objects.all())
+
+    @staticmethod
+    def flag_ids(model, user, recipes):
+        if not user.is_authenticated:
+            return set()
+        return set(model.objects.filter(
+            user=user,
+            recipe_id__in=recipes.values('id')
+        ).values_list('recipe_id', flat=True))
+
+    @staticmethod
+    def set_flags(recipes, favorited, in_cart):
+        for recipe in recipes:
+            recipe.is_favorited = recipe.id in favorited
+            recipe.is_in_shopping_cart = recipe.id in in_cart
+        return recipes
+
+    async def get(self):
+        user = self.request.user
+        validators = RecipeValidators(self.request)
+        (queryset,) = await in_pool(self.filter)
+        number, page_rows, page_size = self.paginate(
+            validators.light_queryset(queryset)
+        )
+        count, rows, favorited, in_cart = await in_pool(
+            queryset.count,
+            lambda: list(page_rows),
+            lambda: self.flag_ids(Favorite, user, page_rows),
+            lambda: self.flag_ids(ShoppingCart, user, page_rows),
+        )
+        page = self.build_page(
+            self.set_flags(rows, favorited, in_cart),
+            count,
+            number,
+            page_size
+        )
+        # Версии справочников при промахе кеша читаются из базы
+        (etag,) = await in_pool(lambda: validators.get_etag(
+            rows,
+            self.view.paginator.get_next_link(),
+            count
+        ))
+        response = validators.not_modified(etag)
+        if response is None:
+            (data,) = await in_pool(
+                lambda: self.serialize(queryset, page, favorited, in_cart)
+            )
+            response = self.view.paginator.get_paginated_response(data)
+        return validators.finalize(response, etag)
+
+    def serialize(self, queryset, page, favorited, in_cart):
+        recipes = RelatedObjectManager.apply_load_plan(
+            queryset,
+            'list',
+            self.request.user
+        ).in_bulk([recipe.id for recipe in page])
+        return self.view.get_serializer(
+            self.set_flags(
+                [recipes[item.id] for item in page if item.id in recipes],
+                favorited,
+                in_cart
+            ),
+            many=True
+        ).data
+
+
+class RecipeDetailView(AsyncReadView):
+    viewset = RecipeViewSet
+    actions = {
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }
+    detail = True
+
+    def flag(self, model):
+        user = self.request.user
+        if not user.is_authenticated:
+            return False
+        return model.objects.filter(
+            user=user,
+            recipe_id=self.kwargs['pk']
+        ).exists()
+
+    async def get(self):
+        validators = RecipeValidators(self.request)
+        recipe, is_favorited, is_in_shopping_cart = await in_pool(
+            lambda: get_object_or_404(
+                validators.light_queryset(Recipe.objects.all()),
+                pk=self.kwargs['pk']
+            ),
+            lambda: self.flag(Favorite),
+            lambda: self.flag(ShoppingCart),
+        )
+        recipe.is_favorited = is_favorited
+        recipe.is_in_shopping_cart = is_in_shopping_cart
+        (etag,) = await in_pool(lambda: validators.get_etag([recipe]))
+        last_modified = validators.get_last_modified(recipe)
+        response = validators.not_modified(etag, last_modified)
+        if response is None:
+            (data,) = await in_pool(lambda: self.serialize_one(recipe))
+            response = Response(data)
+        return validators.finalize(response, etag, last_modified)
+
+    def serialize_one(self, light):
+        recipe = RelatedObjectManager.apply_load_plan(
+            Recipe.objects.all(),
+            'retrieve',
+            self.request.user
+        ).get(pk=light.pk)
+        recipe.is_favorited = light.is_favorited
+        recipe.is_in_shopping_cart = light.is_in_shopping_cart
+        return self.view.get_serializer(recipe).data
+
+
+class SubscriptionsView(AsyncReadView):
+    viewset = CustomUserViewSet
+    actions = {'get': 'subscriptions'}
+
+    async def get(self):
+        user = self.request.user
+        recipes_limit = get_recipes_limit(self.request)
+        authors = RelatedObjectManager.annotate_is_subscribed(
+            User.objects.filter(subscrime__user=user),
+            user
+        ).order_by('id')
+        number, page_rows, page_size = self.paginate(authors)
+        count, rows = await in_pool(authors.count, lambda: list(page_rows))
+        if not count:
+            return Response(
+                {'Вы не подписались ни на кого'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        self.build_page(rows, count, number, page_size)
+        (data,) = await in_pool(lambda: SubscrimeSerializer(
+            RelatedObjectManager.prefetch_limited_recipes(rows, recipes_limit),
+            context={'request': self.request},
+            many=True,
+        ).data)
+        return self.view.paginator.get_paginated_response(data)
+
+
+class IngredientSearchView(AsyncReadView):
+    viewset = IngredientViewSet
+    actions = {'get': 'list'}
+
+    @classmethod
+    def supports(cls, request):
+        return bool(request.GET.get('name'))
+
+    async def get(self):
+        name = self.request.query_params['name']
+        (found,) = await in_pool(lambda: ingredient_index.search(name))
+        return Response(found)
@@ -0,0 +1,91 @@
+import gzip
+import hashlib
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+
+from .metrics import cache_result
+
+CATALOG_MODELS = {'tags': Tag, 'ingredients': Ingredient}
+CATALOG_VERSION_KEY = 'catalog-version:{catalog}'
+CATALOG_KEY = 'catalog:{catalog}:{version}'
+# Версия справочника берется из базы и кешируется ненадолго: сигналы
+# сбрасывают ее сразу, но с локальным кешем только в своем процессе,
+# остальные процессы увидят изменения не позже чем через этот срок
+CATALOG_VERSION_TIMEOUT = 60
+CATALOG_TIMEOUT = 60 * 60 * 24
+
+
+def get_catalog_version(catalog):
+    """Число записей и время последнего изменения справочника"""
+    key = CATALOG_VERSION_KEY.format(catalog=catalog)
+    version = cache.get(key)
+    if version is None:
+        state = CATALOG_MODELS[catalog].objects.aggregate(
+            count=Count('id'),
+            updated_at=Max('updated_at'),
+        )
+        updated_at = state['updated_at']
+        version = '{}-{}'.format(
+            state['count'],
+            updated_at.timestamp() if updated_at else 0
+        )
+        cache.set(key, version, CATALOG_VERSION_TIMEOUT)
+    return version
+
+
+def bump_catalog_version(catalog):
+    """Сбрасывает версию сразу и еще раз после фиксации транзакции:
+    до нее другие соединения могли закешировать старую версию"""
+    key = CATALOG_VERSION_KEY.format(catalog=catalog)
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+class CatalogCache:
+    """Готовые JSON и gzip ответы справочника под текущей версией"""
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        self.key = CATALOG_KEY.format(
+            catalog=catalog,
+            version=get_catalog_version(catalog)
+        )
+
+    def get_or_build(self, build_data):
+        entry = cache.get(self.key)
+        cache_result(f'catalog:{self.catalog}', entry is not None)
+        if entry is None:
+            body = JSONRenderer().render(build_data())
+            etag = hashlib.sha256(body).hexdigest()[:32]
+            entry = {
+                'identity': (body, f'"{etag}"'),
+                'gzip': (gzip.compress(body), f'"{etag}-gzip"'),
+            }
+            cache.set(self.key, entry, CATALOG_TIMEOUT)
+        return entry
+
+    def response(self, request, build_data):
+        entry = self.get_or_build(build_data)
+        encoding = (
+            'gzip'
+            if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+            else 'identity'
+        )
+        body, etag = entry[encoding]
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        if etag in if_none_match or if_none_match.strip() == '*':
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(body, content_type='application/json')
+            if encoding == 'gzip':
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
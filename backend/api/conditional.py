@@ -0,0 +1,101 @@
+import hashlib
+
+from django.db.models import Exists, OuterRef
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+from users.models import Subscrime
+
+from .catalog import get_catalog_version
+from .metrics import cache_result
+
+VALIDATOR_FIELDS = (
+    'id',
+    'pub_data',
+    'updated_at',
+    'author__username',
+    'author__email',
+    'author__first_name',
+    'author__last_name',
+)
+CONDITIONAL_HEADERS = {'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE'}
+
+
+class RecipeValidators:
+    """ETag/Last-Modified рецептов без загрузки и сериализации данных.
+
+    ETag учитывает updated_at, флаги текущего пользователя, данные
+    автора и версии справочников тегов и ингредиентов; готовность копий
+    картинки отражается в updated_at задачей build_image_derivatives.
+    Last-Modified
+    отдается только анонимам и только для одного рецепта: изменения
+    избранного и подписок не имеют времени, а у страницы списка удаление
+    рецепта или смена ее состава не сдвигают максимальный updated_at.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.user = request.user
+
+    def light_queryset(self, queryset):
+        """Флаги рецептов уже аннотированы в RecipeViewSet.get_queryset"""
+        queryset = queryset.prefetch_related(None).select_related(
+            'author'
+        ).only(*VALIDATOR_FIELDS)
+        if not self.user.is_authenticated:
+            return queryset
+        return queryset.annotate(author_is_subscribed=Exists(
+            Subscrime.objects.filter(
+                user=self.user,
+                author_id=OuterRef('author_id')
+            )
+        ))
+
+    def get_etag(self, recipes, *extra):
+        state = [
+            self.request.get_full_path(),
+            self.user.pk,
+            get_catalog_version('tags'),
+            get_catalog_version('ingredients'),
+            *extra,
+        ]
+        for recipe in recipes:
+            author = recipe.author
+            state.append((
+                recipe.id,
+                recipe.updated_at.isoformat(),
+                author.username,
+                author.email,
+                author.first_name,
+                author.last_name,
+                getattr(recipe, 'is_favorited', False),
+                getattr(recipe, 'is_in_shopping_cart', False),
+                getattr(recipe, 'author_is_subscribed', False),
+            ))
+        return quote_etag(
+            hashlib.sha256(repr(state).encode()).hexdigest()[:32]
+        )
+
+    def get_last_modified(self, recipe):
+        if self.user.is_authenticated:
+            return None
+        return int(recipe.updated_at.timestamp())
+
+    def not_modified(self, etag, last_modified=None):
+        response = get_conditional_response(
+            self.request,
+            etag=etag,
+            last_modified=last_modified
+        )
+        if CONDITIONAL_HEADERS.intersection(self.request.META):
+            cache_result('recipe_etag', response is not None)
+        return response
+
+    def finalize(self, response, etag, last_modified=None):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ('Authorization',))
+        return response
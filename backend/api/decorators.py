@@ -3,6 +3,7 @@ from functools import wraps
 
 from django.apps import apps
 from django.contrib.auth.models import AnonymousUser
+from django.db import transaction
 from django.db.models import Exists, OuterRef
 from django.shortcuts import get_object_or_404
 from recipes.constant import User
@@ -13,7 +14,12 @@ from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
-from .managers import RelatedObjectManager
+from .catalog import CatalogCache
+from .exports import bump_recipe_carts
+from .managers import (RelatedObjectManager, RelationWriter,
+                       ShoppingListAggregator)
+from .pagination import get_recipes_limit
+from .signals import subscriptions_changed
 
 
 def subscribe_decorator(serializer_class):
@@ -36,14 +42,19 @@ def subscribe_decorator(serializer_class):
 
 
 def create_subscription(request, view, sub_author, serializer_class):
-    sub_instance, new_create = apps.get_model(
-        'users',
-        'Subscrime'
-    ).objects.get_or_create(
-        user=request.user,
-        author=sub_author
-    )
-    if not new_create:
+    if sub_author.pk == request.user.pk:
+        return Response(
+            'Вы не можете подписаться на самого себя.',
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    with transaction.atomic(savepoint=False):
+        created = RelationWriter.insert(
+            apps.get_model('users', 'Subscrime'),
+            [{'user_id': request.user.id, 'author_id': sub_author.id}],
+            'author_id'
+        )
+        subscriptions_changed(request.user.id, created, 1)
+    if not created:
         return Response(
             'Уже есть подписка на данного автора',
             status=status.HTTP_400_BAD_REQUEST
@@ -53,21 +64,20 @@ def create_subscription(request, view, sub_author, serializer_class):
 
 
 def delete_subscription(request, view, sub_author):
-    try:
-        sub_instance = apps.get_model(
-            'users',
-            'Subscrime'
-        ).objects.get(
-            user=request.user,
-            author=sub_author
+    with transaction.atomic(savepoint=False):
+        removed = RelationWriter.delete(
+            apps.get_model('users', 'Subscrime'),
+            'author_id',
+            user_id=request.user.id,
+            author_id=sub_author.id
         )
-        sub_instance.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
-    except apps.get_model('users', 'Subscrime').DoesNotExist:
+        subscriptions_changed(request.user.id, removed, -1)
+    if not removed:
         return Response(
             'Подписка не существует или еще не создана',
             status=status.HTTP_400_BAD_REQUEST
         )
+    return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 def recipes_decorator(serializer):
@@ -75,7 +85,7 @@ def recipes_decorator(serializer):
         @wraps(func)
         def handler(self, instance):
             request = self.context.get('request')
-            limit = int(request.query_params.get('recipes_limit', 0))
+            limit = get_recipes_limit(request)
 
             recipes = (
                 instance.recipes.all()[:limit]
@@ -101,15 +111,21 @@ def recipe_validate_decorator(func):
 
 
 def recipe_update_decorator(func):
+    @transaction.atomic
     def handler(self, instance, validated_data):
-        recipe_fields = {
-            'tags': RelatedObjectManager.create_tags,
-            'ingredients': RelatedObjectManager.create_ingredients,
-        }
-        for field, create_method in recipe_fields.items():
-            if field in validated_data:
-                RelatedObjectManager.clear_related_fields(instance, field)
-                create_method(validated_data.pop(field), instance)
+        if 'tags' in validated_data:
+            RelatedObjectManager.sync_tags(
+                validated_data.pop('tags'),
+                instance
+            )
+        if 'ingredients' in validated_data:
+            old_amounts = RelatedObjectManager.sync_ingredients(
+                validated_data.pop('ingredients'),
+                instance
+            )
+            if old_amounts is not None:
+                ShoppingListAggregator.update_recipe(instance, old_amounts)
+                bump_recipe_carts(instance)
         return func(self, instance, validated_data)
     return handler
 
@@ -136,10 +152,16 @@ def user_auth_decorator(view_func):
 
 def subscribed_decorator(view_func):
     def handler(self, target):
-        return (
-            self.context['request'].user.is_staff
-            and target.subscrime.exists()
-        )
+        annotated = getattr(target, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
+        user = self.context['request'].user
+        if not user.is_authenticated or user.pk == target.pk:
+            return False
+        return apps.get_model('users', 'Subscrime').objects.filter(
+            user=user,
+            author=target
+        ).exists()
     return handler
 
 
@@ -152,22 +174,23 @@ def get_field_decorator(field_name):
 def subscriptions_decorator(func):
     @wraps(func)
     def handler(self, request, *args, **kwargs):
-        user = User.objects.all()
-        data_source = user.filter(sub_fun__user=self.request.user)
-
-        if not data_source.exists():
+        response = func(self, request, *args, **kwargs)
+        if not response.data['count']:
             return Response(
                 {'Вы не подписались ни на кого'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        return func(self, request, *args, **kwargs)
+        return response
     return handler
 
 
-def customrecipefields_decorator(model):
+def customrecipefields_decorator(model, annotation):
     def decorator(func):
         @wraps(func)
         def handler(self, instance):
+            annotated = getattr(instance, annotation, None)
+            if annotated is not None:
+                return annotated
             return DataValidationHelpers.verify_recipe_relation(
                 instance,
                 self.context['request'].user,
@@ -218,3 +241,40 @@ def sf_action_decorator(
             return action(request, model_class, pk)
         return handler
     return decorator
+
+
+def sf_bulk_action_decorator(
+        model_class,
+        methods=['POST', 'DELETE'],
+        permission_classes=[IsAuthenticated]
+):
+    def decorator(view_func):
+        @action(
+            detail=False,
+            methods=methods,
+            permission_classes=permission_classes
+        )
+        @wraps(view_func)
+        def handler(self, request):
+            action = (
+                self.bulk_create_objects
+                if request.method == 'POST'
+                else self.bulk_delete_objects
+            )
+            return action(request, model_class)
+        return handler
+    return decorator
+
+
+def catalog_cache_decorator(catalog):
+    def decorator(func):
+        @wraps(func)
+        def handler(self, request, *args, **kwargs):
+            if request.query_params:
+                return func(self, request, *args, **kwargs)
+            return CatalogCache(catalog).response(
+                request,
+                lambda: func(self, request, *args, **kwargs).data
+            )
+        return handler
+    return decorator
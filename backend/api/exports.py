@@ -0,0 +1,189 @@
+import csv
+import io
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from django.http import StreamingHttpResponse
+from PIL import Image, ImageDraw, ImageFont
+
+from jobs.queue import enqueue_many
+from recipes.constant import User
+from recipes.models import ShoppingCart
+
+from .catalog import get_catalog_version
+from .managers import RelatedObjectManager
+from .metrics import EXPORT_SIZE, cache_result
+
+EXPORT_TIMEOUT = 60 * 60 * 24
+EXPORT_KEY = 'shopping-list:{user_id}:{version}:{file_format}'
+CSV_HEADER = ('Ингредиент', 'Количество', 'Единица измерения')
+PDF_PAGE_SIZE = (827, 1169)
+PDF_MARGIN = 60
+PDF_FONT_SIZE = 20
+PDF_LINE_HEIGHT = 30
+PROCESS_LOCAL_CACHES = ('LocMemCache', 'DummyCache')
+
+
+def get_cart_version(user_id):
+    """Версия корзины из основной базы и версия справочника ингредиентов.
+
+    Счетчик хранится в строке пользователя, поэтому изменение корзины
+    в одном процессе сразу меняет ключ выгрузки во всех остальных.
+    """
+    revision = User.objects.using(DEFAULT_DB_ALIAS).filter(
+        pk=user_id
+    ).values_list(
+        'cart_revision',
+        flat=True
+    ).first()
+    return f'{revision}-{get_catalog_version("ingredients")}'
+
+
+def prepared_exports_visible():
+    """Файлы, подготовленные воркером, попадут в кеш бэкенда: кеш общий
+    или задачи выполняются в том же процессе"""
+    return settings.JOBS_EAGER or not settings.CACHES['default'][
+        'BACKEND'
+    ].endswith(PROCESS_LOCAL_CACHES)
+
+
+def bump_cart_version(*user_ids):
+    """Сбрасывает выгрузки и ставит в очередь их подготовку заново"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+    User.objects.filter(id__in=user_ids).update(
+        cart_revision=F('cart_revision') + 1
+    )
+    if not prepared_exports_visible():
+        return
+    enqueue_many('render_shopping_list', [
+        {'user_id': user_id} for user_id in user_ids
+    ])
+
+
+def bump_recipe_carts(recipe):
+    """Сбрасывает выгрузки всех, у кого рецепт в списке покупок"""
+    bump_cart_version(*ShoppingCart.objects.filter(
+        recipe=recipe
+    ).values_list('user_id', flat=True))
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def render_txt(rows):
+    for row in rows:
+        yield (
+            f'{row["ingredient__name"]}'
+            f'- {row["total_amount"]}'
+            f'- {row["ingredient__measurement_unit"]}\n'
+        ).encode()
+
+
+def render_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER).encode()
+    for row in rows:
+        yield writer.writerow((
+            row['ingredient__name'],
+            row['total_amount'],
+            row['ingredient__measurement_unit'],
+        )).encode()
+
+
+def load_pdf_font():
+    try:
+        return ImageFont.truetype(settings.SHOPPING_LIST_FONT, PDF_FONT_SIZE)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_pdf(rows):
+    font = load_pdf_font()
+    lines = [
+        f'{row["ingredient__name"]} - {row["total_amount"]} '
+        f'{row["ingredient__measurement_unit"]}'
+        for row in rows
+    ]
+    per_page = (PDF_PAGE_SIZE[1] - 2 * PDF_MARGIN) // PDF_LINE_HEIGHT
+    pages = []
+    for start in range(0, max(len(lines), 1), per_page):
+        page = Image.new('RGB', PDF_PAGE_SIZE, 'white')
+        draw = ImageDraw.Draw(page)
+        for number, line in enumerate(lines[start:start + per_page]):
+            draw.text(
+                (PDF_MARGIN, PDF_MARGIN + number * PDF_LINE_HEIGHT),
+                line,
+                fill='black',
+                font=font
+            )
+        pages.append(page)
+    buffer = io.BytesIO()
+    pages[0].save(
+        buffer,
+        format='PDF',
+        save_all=True,
+        append_images=pages[1:]
+    )
+    yield buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', render_txt),
+    'csv': ('text/csv; charset=utf-8', render_csv),
+    'pdf': ('application/pdf', render_pdf),
+}
+
+
+class ShoppingListExport:
+    """Потоковая выгрузка списка покупок с кешем по версии корзины"""
+
+    def __init__(self, user, file_format):
+        self.user = user
+        self.file_format = file_format
+        self.content_type, self.renderer = EXPORT_FORMATS[file_format]
+        self.cache_key = EXPORT_KEY.format(
+            user_id=user.id,
+            version=get_cart_version(user.id),
+            file_format=file_format
+        )
+
+    def render_and_cache(self):
+        chunks = []
+        # Файл кешируется надолго, поэтому читается с основной базы:
+        # отстающая реплика сохранила бы под новой версией старый список
+        for chunk in self.renderer(
+            RelatedObjectManager.get_uniq_ingredients(self.user).using(
+                DEFAULT_DB_ALIAS
+            )
+        ):
+            chunks.append(chunk)
+            yield chunk
+        content = b''.join(chunks)
+        EXPORT_SIZE.observe(len(content), format=self.file_format)
+        cache.set(self.cache_key, content, EXPORT_TIMEOUT)
+
+    def prepare(self):
+        """Готовит файл заранее, чтобы скачивание шло из кеша"""
+        if cache.get(self.cache_key) is None:
+            for _ in self.render_and_cache():
+                pass
+
+    def response(self, filename):
+        content = cache.get(self.cache_key)
+        cache_result('shopping_list', content is not None)
+        response = StreamingHttpResponse(
+            self.render_and_cache() if content is None else [content],
+            content_type=self.content_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{filename}.{self.file_format}"'
+        )
+        return response
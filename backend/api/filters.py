@@ -1,26 +1,10 @@
 from django_filters import rest_framework as filters
 
-from rest_framework.filters import BaseFilterBackend
-
 from recipes.models import Recipe, Tag
 
 from .decorators import filter_custom_decorator
 
 
-class IngredientsFilter(BaseFilterBackend):
-    def filter_queryset(self, request, queryset, view):
-        name = request.query_params.get('name', None)
-        search_method = request.query_params.get('search_method', 'startswith')
-
-        if name:
-            filter_kwargs = {
-                f'name__i{search_method}': name
-            }
-            queryset = queryset.filter(**filter_kwargs)
-
-        return queryset
-
-
 class RecipeFilter(filters.FilterSet):
 
     tags = filters.ModelMultipleChoiceFilter(
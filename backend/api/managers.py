@@ -1,7 +1,15 @@
-from django.db.models import Sum
-from django.db.models.functions import Coalesce
-from django.http import HttpResponse
-from recipes.models import IngredientsRecipe, Recipe, RecipeTag
+from collections import Counter, defaultdict
+
+from django.db import connections, router, transaction
+from django.db.models import (BooleanField, Case, Count, Exists, F, OuterRef,
+                              Prefetch, Subquery, Sum, Value, When, Window,
+                              prefetch_related_objects)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, Greatest, RowNumber
+from recipes.constant import User
+from recipes.models import (Favorite, FeedEntry, IngredientsRecipe, Recipe,
+                            RecipeTag, ShoppingCart, ShoppingListItem)
+from users.models import Subscrime
 
 
 class BulkRelatedObjectCreator:
@@ -19,19 +27,97 @@ class BulkRelatedObjectCreator:
 class RelatedObjectManager:
 
     @staticmethod
-    def get_uniq_ingredients(user):
-        uniq_ingredients = IngredientsRecipe.objects.filter(
-            recipe__shoppingcart__user=user
-        ).values('ingredient__name', 'ingredient__measurement_unit').annotate(
-            total_amount=Coalesce(Sum('amount'), 0)
+    def annotate_is_subscribed(queryset, user):
+        """Подписан ли текущий пользователь на каждого из выборки"""
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_subscribed=Value(False, output_field=BooleanField())
+            )
+        return queryset.annotate(is_subscribed=Exists(
+            Subscrime.objects.filter(user=user, author_id=OuterRef('pk'))
+        ))
+
+    @classmethod
+    def load_plan(cls, user):
+        """Связи, которые читает RecipeSerializer"""
+        return (
+            Prefetch(
+                'author',
+                queryset=cls.annotate_is_subscribed(User.objects.all(), user)
+            ),
+            'tags',
+            Prefetch(
+                'ingredients_recipe',
+                queryset=IngredientsRecipe.objects.select_related(
+                    'ingredient'
+                )
+            ),
         )
-        return uniq_ingredients
+
+    @classmethod
+    def apply_load_plan(cls, queryset, action, user):
+        """Жадная загрузка связей, которые читает RecipeSerializer"""
+        if action not in ('list', 'retrieve', 'feed'):
+            return queryset
+        return queryset.prefetch_related(*cls.load_plan(user))
 
     @staticmethod
-    def create_download_response(content, filename):
-        response = HttpResponse(content, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+    def annotate_recipe_flags(queryset, user):
+        """Флаги избранного и списка покупок одним запросом со страницей"""
+        if not user.is_authenticated:
+            return queryset.annotate(
+                is_favorited=Value(False, output_field=BooleanField()),
+                is_in_shopping_cart=Value(False, output_field=BooleanField()),
+            )
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe_id=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(
+                    user=user,
+                    recipe_id=OuterRef('pk')
+                )
+            ),
+        )
+
+    @staticmethod
+    def prefetch_limited_recipes(authors, limit):
+        """Первые limit рецептов каждого автора одним запросом"""
+        recipes = Recipe.objects.only(
+            'id',
+            'name',
+            'image',
+            'cooking_time',
+            'author'
+        )
+        if limit > 0:
+            ranked = Recipe.objects.filter(
+                author_id__in=[author.id for author in authors]
+            ).annotate(row_number=Window(
+                RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('pub_data').desc(), F('id').desc()]
+            )).order_by().values('id', 'row_number')
+            sql, params = ranked.query.sql_with_params()
+            recipes = recipes.filter(id__in=RawSQL(
+                f'SELECT ranked.id FROM ({sql}) ranked '
+                f'WHERE ranked.row_number <= %s',
+                (*params, limit)
+            ))
+        prefetch_related_objects(
+            authors,
+            Prefetch('recipes', queryset=recipes)
+        )
+        return authors
+
+    @staticmethod
+    def get_uniq_ingredients(user):
+        return ShoppingListItem.objects.filter(user=user).values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'total_amount'
+        ).order_by('ingredient__name')
 
     @staticmethod
     def create_recipe(validated_data, author):
@@ -57,6 +143,431 @@ class RelatedObjectManager:
         )
 
     @staticmethod
-    def clear_related_fields(instance, field_name):
-        related_field = getattr(instance, field_name)
-        related_field.clear()
+    def sync_tags(tags, recipe):
+        """Добавляет и удаляет только изменившиеся теги рецепта"""
+        existing = set(RecipeTag.objects.filter(recipe=recipe).values_list(
+            'tag_id',
+            flat=True
+        ))
+        wanted = {tag.id for tag in tags}
+        if existing - wanted:
+            RecipeTag.objects.filter(
+                recipe=recipe,
+                tag_id__in=existing - wanted
+            ).delete()
+        RecipeTag.objects.bulk_create([
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for tag_id in wanted - existing
+        ])
+        return existing != wanted
+
+    @staticmethod
+    def sync_ingredients(ingredients, recipe):
+        """Применяет к составу рецепта только вставки, правки и удаления.
+
+        Возвращает прежние количества ингредиентов, если состав
+        изменился, иначе None.
+        """
+        wanted = {item['id']: item['amount'] for item in ingredients}
+        old_amounts = Counter()
+        stale, changed = [], []
+        for row in IngredientsRecipe.objects.filter(recipe=recipe).only(
+            'id',
+            'ingredient',
+            'amount'
+        ):
+            seen = row.ingredient_id in old_amounts
+            old_amounts[row.ingredient_id] += row.amount
+            if seen or row.ingredient_id not in wanted:
+                stale.append(row.id)
+            elif row.amount != wanted[row.ingredient_id]:
+                row.amount = wanted[row.ingredient_id]
+                changed.append(row)
+        if stale:
+            IngredientsRecipe.objects.filter(id__in=stale).delete()
+        if changed:
+            IngredientsRecipe.objects.bulk_update(changed, ('amount',))
+        added = [
+            IngredientsRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=amount
+            )
+            for ingredient_id, amount in wanted.items()
+            if ingredient_id not in old_amounts
+        ]
+        IngredientsRecipe.objects.bulk_create(added)
+        if stale or changed or added:
+            return old_amounts
+        return None
+
+
+class ShoppingListAggregator:
+    """Поддержка таблицы ShoppingListItem в актуальном состоянии.
+
+    Каждое изменение списка покупок или состава рецепта из него
+    превращается в набор дельт по ингредиентам, которые применяются
+    к строкам затронутых пользователей за O(ингредиентов рецепта).
+    """
+
+    @staticmethod
+    def recipe_amounts(*recipe_ids):
+        amounts = Counter()
+        for ingredient_id, amount in IngredientsRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('ingredient_id', 'amount'):
+            amounts[ingredient_id] += amount
+        return amounts
+
+    @staticmethod
+    @transaction.atomic
+    def apply(user_ids, deltas):
+        """Прибавляет дельты к строкам пользователей.
+
+        Положительные дельты вставляются одним upsert, поэтому
+        параллельное добавление той же позиции не нарушает уникальность.
+        Отрицательные дельты уменьшают только существующие строки, а
+        обнулившиеся строки удаляются.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        increments = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items()
+            if delta > 0
+        }
+        decrements = {
+            ingredient_id: delta
+            for ingredient_id, delta in deltas.items()
+            if delta < 0
+        }
+        if decrements:
+            items = ShoppingListItem.objects.filter(
+                user_id__in=user_ids,
+                ingredient_id__in=decrements
+            )
+            items.update(total_amount=Greatest(
+                F('total_amount') + Case(
+                    *[
+                        When(ingredient_id=ingredient_id, then=Value(delta))
+                        for ingredient_id, delta in decrements.items()
+                    ],
+                    default=Value(0)
+                ),
+                Value(0)
+            ))
+            items.filter(total_amount=0).delete()
+        RelationWriter.increment(
+            ShoppingListItem,
+            [
+                {
+                    'user_id': user_id,
+                    'ingredient_id': ingredient_id,
+                    'total_amount': delta,
+                }
+                for user_id in user_ids
+                for ingredient_id, delta in increments.items()
+            ],
+            unique=('user_id', 'ingredient_id'),
+            field='total_amount'
+        )
+
+    @classmethod
+    def add_recipe(cls, user_id, *recipe_ids):
+        cls.apply([user_id], cls.recipe_amounts(*recipe_ids))
+
+    @classmethod
+    def remove_recipe(cls, user_id, *recipe_ids):
+        cls.apply([user_id], {
+            ingredient_id: -amount
+            for ingredient_id, amount in cls.recipe_amounts(
+                *recipe_ids
+            ).items()
+        })
+
+    @classmethod
+    def update_recipe(cls, recipe, old_amounts):
+        """Переносит изменение состава рецепта во все списки покупок"""
+        deltas = cls.recipe_amounts(recipe.id)
+        deltas.subtract(old_amounts)
+        cls.apply(
+            list(ShoppingCart.objects.filter(recipe=recipe).values_list(
+                'user_id',
+                flat=True
+            )),
+            deltas
+        )
+
+    @staticmethod
+    def expected_totals(user_ids=None):
+        lookup = (
+            {'recipe__shoppingcart__isnull': False}
+            if user_ids is None
+            else {'recipe__shoppingcart__user_id__in': user_ids}
+        )
+        rows = IngredientsRecipe.objects.filter(**lookup).values(
+            'recipe__shoppingcart__user',
+            'ingredient'
+        ).annotate(total_amount=Sum('amount')).order_by()
+        return {
+            (row['recipe__shoppingcart__user'], row['ingredient']):
+                row['total_amount']
+            for row in rows
+        }
+
+    @staticmethod
+    def stored_totals(user_ids=None):
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        return {
+            (user_id, ingredient_id): total_amount
+            for user_id, ingredient_id, total_amount in items.values_list(
+                'user_id',
+                'ingredient_id',
+                'total_amount'
+            )
+        }
+
+    @classmethod
+    def drifted_users(cls, user_ids=None):
+        expected = cls.expected_totals(user_ids)
+        stored = cls.stored_totals(user_ids)
+        return {
+            user_id
+            for user_id, ingredient_id in expected.keys() | stored.keys()
+            if expected.get((user_id, ingredient_id))
+            != stored.get((user_id, ingredient_id))
+        }
+
+    @classmethod
+    @transaction.atomic
+    def rebuild(cls, user_ids=None):
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        ShoppingListItem.objects.bulk_create(
+            [
+                ShoppingListItem(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=total_amount
+                )
+                for (user_id, ingredient_id), total_amount
+                in cls.expected_totals(user_ids).items()
+            ],
+            batch_size=1000
+        )
+
+
+class CounterManager:
+    """Денормализованные счетчики рецептов и пользователей"""
+    COUNTERS = (
+        (Recipe, 'favorites_count', Favorite, 'recipe'),
+        (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+        (User, 'recipes_count', Recipe, 'author'),
+        (User, 'followers_count', Subscrime, 'author'),
+    )
+
+    @staticmethod
+    def shift(model, pks, field, delta):
+        model.objects.filter(pk__in=pks).update(
+            **{field: Greatest(F(field) + delta, Value(0))}
+        )
+
+    @classmethod
+    def on_change(cls, sender, instances, delta):
+        """Сдвигает счетчики, которые считают строки модели sender"""
+        for model, field, source, fk in cls.COUNTERS:
+            if source is sender:
+                by_total = defaultdict(list)
+                for pk, total in Counter(
+                    getattr(instance, f'{fk}_id') for instance in instances
+                ).items():
+                    by_total[total].append(pk)
+                for total, pks in by_total.items():
+                    cls.shift(model, pks, field, delta * total)
+
+    @staticmethod
+    def actual_count(source, fk):
+        return Coalesce(Subquery(
+            source.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+                fk
+            ).annotate(total=Count('pk')).values('total')
+        ), 0)
+
+    @classmethod
+    def reconcile(cls, check=False):
+        """Находит и, если не check, исправляет расхождения счетчиков"""
+        drift = {}
+        for model, field, source, fk in cls.COUNTERS:
+            actual = cls.actual_count(source, fk)
+            stale = list(model.objects.annotate(
+                actual=actual
+            ).exclude(**{field: F('actual')}).values_list('pk', flat=True))
+            drift[f'{model._meta.model_name}.{field}'] = len(stale)
+            if check:
+                continue
+            for start in range(0, len(stale), 1000):
+                model.objects.filter(
+                    pk__in=stale[start:start + 1000]
+                ).update(**{field: actual})
+        return drift
+
+
+class RelationWriter:
+    """Вставка и удаление связей одним запросом.
+
+    RETURNING сообщает, какие строки действительно вставлены или
+    удалены, поэтому параллельные запросы не создают дублей и не
+    сдвигают счетчики дважды. Сигналы при этом не отправляются.
+    """
+
+    @staticmethod
+    def get_connection(model):
+        return connections[router.db_for_write(model)]
+
+    @classmethod
+    def values(cls, connection, model, rows):
+        """Список колонок, VALUES и параметры для вставки строк"""
+        quote = connection.ops.quote_name
+        names = list(rows[0])
+        fields = [model._meta.get_field(name) for name in names]
+        placeholders = ', '.join(['%s'] * len(fields))
+        params = [
+            field.get_db_prep_value(row[name], connection)
+            for row in rows
+            for name, field in zip(names, fields)
+        ]
+        return (
+            f'({", ".join(quote(field.column) for field in fields)}) '
+            f'VALUES {", ".join([f"({placeholders})"] * len(rows))}',
+            params
+        )
+
+    @classmethod
+    def insert(cls, model, rows, returning):
+        """INSERT ... ON CONFLICT DO NOTHING по уникальным ограничениям"""
+        if not rows:
+            return []
+        connection = cls.get_connection(model)
+        quote = connection.ops.quote_name
+        values, params = cls.values(connection, model, rows)
+        sql = (
+            f'INSERT INTO {quote(model._meta.db_table)} {values} '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {quote(model._meta.get_field(returning).column)}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [value for value, in cursor.fetchall()]
+
+    @classmethod
+    def increment(cls, model, rows, unique, field, batch_size=1000):
+        """INSERT ... ON CONFLICT (unique) DO UPDATE: в существующей
+        строке значение field увеличивается на вставляемое"""
+        connection = cls.get_connection(model)
+        quote = connection.ops.quote_name
+        table = quote(model._meta.db_table)
+        column = quote(model._meta.get_field(field).column)
+        conflict = ', '.join(
+            quote(model._meta.get_field(name).column) for name in unique
+        )
+        for start in range(0, len(rows), batch_size):
+            values, params = cls.values(
+                connection,
+                model,
+                rows[start:start + batch_size]
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {table} {values} '
+                    f'ON CONFLICT ({conflict}) DO UPDATE '
+                    f'SET {column} = {table}.{column} + EXCLUDED.{column}',
+                    params
+                )
+
+    @classmethod
+    def delete(cls, model, returning, **lookups):
+        """DELETE ... RETURNING; список в значении означает IN (...)"""
+        connection = cls.get_connection(model)
+        quote = connection.ops.quote_name
+        conditions, params = [], []
+        for name, value in lookups.items():
+            field = model._meta.get_field(name)
+            values = value if isinstance(value, (list, tuple, set)) else None
+            if values is None:
+                conditions.append(f'{quote(field.column)} = %s')
+                params.append(field.get_db_prep_value(value, connection))
+                continue
+            if not values:
+                return []
+            conditions.append(
+                f'{quote(field.column)} IN '
+                f'({", ".join(["%s"] * len(values))})'
+            )
+            params.extend(
+                field.get_db_prep_value(item, connection) for item in values
+            )
+        sql = (
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {" AND ".join(conditions)} '
+            f'RETURNING {quote(model._meta.get_field(returning).column)}'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [value for value, in cursor.fetchall()]
+
+
+class FeedManager:
+    """Лента подписок: fan-out при публикации и дозаполнение при подписке.
+
+    Записи вставляются одним INSERT ... SELECT ... ON CONFLICT DO NOTHING,
+    поэтому повторный или параллельный вызов не создает дублей. Чтение
+    ленты - диапазон индекса (user, -pub_data, -recipe).
+    """
+
+    @staticmethod
+    def fill(condition, params):
+        connection = RelationWriter.get_connection(FeedEntry)
+        quote = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(FeedEntry._meta.db_table)} '
+                f'(user_id, recipe_id, author_id, pub_data) '
+                f'SELECT s.user_id, r.id, r.author_id, r.pub_data '
+                f'FROM {quote(Subscrime._meta.db_table)} s '
+                f'INNER JOIN {quote(Recipe._meta.db_table)} r '
+                f'ON r.author_id = s.author_id '
+                f'WHERE {condition} '
+                f'ON CONFLICT DO NOTHING',
+                params
+            )
+            return cursor.rowcount
+
+    @classmethod
+    def fan_out(cls, recipe_id):
+        """Добавляет рецепт в ленты всех подписчиков автора"""
+        return cls.fill('r.id = %s', [recipe_id])
+
+    @classmethod
+    def backfill(cls, user_id, author_ids):
+        """Добавляет в ленту рецепты новых подписок"""
+        if not author_ids:
+            return 0
+        return cls.fill(
+            f's.user_id = %s AND s.author_id IN '
+            f'({", ".join(["%s"] * len(author_ids))})',
+            [user_id, *author_ids]
+        )
+
+    @staticmethod
+    def forget(user_id, author_ids):
+        """Убирает из ленты рецепты отмененных подписок"""
+        if author_ids:
+            FeedEntry.objects.filter(
+                user_id=user_id,
+                author_id__in=author_ids
+            ).delete()
@@ -0,0 +1,408 @@
+import atexit
+import fcntl
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from glob import glob
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from foodgram.middleware import SyncAndAsyncMiddleware
+
+from .profiling import RequestProfile, current_profile
+
+ARCHIVE_NAME = 'archive.json'
+LOCK_NAME = '.lock'
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+FLUSH_INTERVAL = 1.0
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def escape(value):
+    return (
+        str(value)
+        .replace('\\', '\\\\')
+        .replace('\n', '\\n')
+        .replace('"', '\\"')
+    )
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+    return f'{{{pairs}}}'
+
+
+def format_number(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, registry, name, documentation, labels=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+
+    def initial(self):
+        return 0
+
+    def inc(self, amount=1, **labels):
+        def add(value):
+            return value + amount
+        self.registry.update(self, labels, add)
+
+    def samples(self, key, value):
+        yield self.name, tuple(zip(self.labels, key)), value
+
+
+class Histogram(Counter):
+    """Счетчики по корзинам (без накопления), затем +Inf и сумма"""
+    kind = 'histogram'
+
+    def __init__(self, registry, name, documentation, labels=(),
+                 buckets=LATENCY_BUCKETS):
+        super().__init__(registry, name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def initial(self):
+        return [0] * (len(self.buckets) + 2)
+
+    def observe(self, amount, **labels):
+        index = bisect_left(self.buckets, amount)
+
+        def add(value):
+            value = list(value)
+            value[index] += 1
+            value[-1] += amount
+            return value
+        self.registry.update(self, labels, add)
+
+    def samples(self, key, value):
+        labels = tuple(zip(self.labels, key))
+        total = 0
+        for bound, count in zip(
+            self.buckets + (float('inf'),),
+            value[:-1]
+        ):
+            total += count
+            yield (
+                f'{self.name}_bucket',
+                labels + (('le', format_number(bound)),),
+                total
+            )
+        yield f'{self.name}_sum', labels, value[-1]
+        yield f'{self.name}_count', labels, total
+
+
+def merge(left, right):
+    if isinstance(left, list):
+        return [a + b for a, b in zip(left, right)]
+    return left + right
+
+
+def merge_snapshots(snapshots):
+    merged = {}
+    for snapshot in snapshots:
+        for name, values in snapshot.items():
+            target = merged.setdefault(name, {})
+            for key, value in values:
+                key = tuple(key)
+                target[key] = (
+                    merge(target[key], value) if key in target else value
+                )
+    return merged
+
+
+def read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_json(path, data):
+    temporary = f'{path}.tmp'
+    with open(temporary, 'w') as file:
+        json.dump(data, file)
+    os.replace(temporary, path)
+
+
+def file_pid(path):
+    try:
+        return int(os.path.basename(path).split('-', 1)[0])
+    except ValueError:
+        return None
+
+
+def pid_alive(pid):
+    if pid is None:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """Метрики процесса с выводом в текстовом формате Prometheus.
+
+    Если задан METRICS_DIR, каждый процесс раз в FLUSH_INTERVAL секунд
+    сохраняет свои значения в отдельный файл {pid}-{id}.json этого
+    каталога, а при выдаче метрик значения из всех файлов суммируются.
+    Так данные воркеров gunicorn и фоновых задач собираются в один
+    ответ. Файлы завершившихся процессов сворачиваются в ARCHIVE_NAME:
+    процесс делает это сам при штатном выходе, а файлы убитых процессов
+    забирает следующая выдача метрик. Поэтому каталог не растет, а
+    счетчики завершившихся процессов не теряются.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+        self.values = {}
+        self.pid = os.getpid()
+        self.path = None
+        self.flushed_at = 0.0
+        atexit.register(self.retire)
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(self, name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), **kwargs):
+        return self.register(
+            Histogram(self, name, documentation, labels, **kwargs)
+        )
+
+    @property
+    def directory(self):
+        return getattr(settings, 'METRICS_DIR', '')
+
+    def update(self, metric, labels, change):
+        key = tuple(str(labels[name]) for name in metric.labels)
+        with self.lock:
+            if os.getpid() != self.pid:
+                # Дочерний процесс после fork не наследует чужие значения
+                self.values = {}
+                self.pid = os.getpid()
+                self.path = None
+            values = self.values.setdefault(metric.name, {})
+            values[key] = change(values.get(key, metric.initial()))
+        if (
+            self.directory
+            and time.monotonic() - self.flushed_at >= FLUSH_INTERVAL
+        ):
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                name: [[list(key), value] for key, value in values.items()]
+                for name, values in self.values.items()
+            }
+
+    def flush(self):
+        if not self.directory or os.getpid() != self.pid:
+            return
+        self.flushed_at = time.monotonic()
+        if self.path is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self.path = os.path.join(
+                self.directory,
+                f'{self.pid}-{uuid4().hex[:8]}.json'
+            )
+        write_json(self.path, self.snapshot())
+
+    @contextmanager
+    def locked(self, operation):
+        """Блокировка каталога: свертка архива исключает чтение файлов"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, LOCK_NAME), 'a') as lock:
+            fcntl.flock(lock, operation)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def process_files(self):
+        return [
+            path
+            for path in glob(os.path.join(self.directory, '*.json'))
+            if os.path.basename(path) != ARCHIVE_NAME
+        ]
+
+    def archive(self, retired=()):
+        """Сворачивает в архив файлы retired и процессов, которых нет"""
+        with self.locked(fcntl.LOCK_EX):
+            paths = [
+                path for path in self.process_files()
+                if path in retired or not pid_alive(file_pid(path))
+            ]
+            if not paths:
+                return
+            archive_path = os.path.join(self.directory, ARCHIVE_NAME)
+            merged = merge_snapshots(
+                read_json(path) for path in [archive_path, *paths]
+            )
+            write_json(archive_path, {
+                name: [[list(key), value] for key, value in values.items()]
+                for name, values in merged.items()
+            })
+            for path in paths:
+                os.remove(path)
+
+    def retire(self):
+        """При выходе процесса его значения переносятся в архив"""
+        if not self.directory or os.getpid() != self.pid:
+            return
+        self.flush()
+        if self.path is None:
+            return
+        self.archive(retired=(self.path,))
+        with self.lock:
+            # Значения уже в архиве: то, что придет после, пишется заново
+            self.values = {}
+            self.path = None
+
+    def snapshots(self):
+        if not self.directory:
+            yield self.snapshot()
+            return
+        self.flush()
+        self.archive()
+        with self.locked(fcntl.LOCK_SH):
+            for path in glob(os.path.join(self.directory, '*.json')):
+                yield read_json(path)
+
+    def collect(self):
+        return {
+            name: values
+            for name, values in merge_snapshots(self.snapshots()).items()
+            if name in self.metrics
+        }
+
+    def exposition(self):
+        collected = self.collect()
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            lines.append(f'# HELP {name} {escape(metric.documentation)}')
+            lines.append(f'# TYPE {name} {metric.kind}')
+            for key, value in sorted(collected.get(name, {}).items()):
+                for sample, labels, number in metric.samples(key, value):
+                    lines.append(
+                        f'{sample}{format_labels(labels)} '
+                        f'{format_number(number)}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+REQUEST_LATENCY = REGISTRY.histogram(
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса',
+    ('view', 'action', 'method', 'status'),
+)
+REQUEST_QUERIES = REGISTRY.histogram(
+    'foodgram_http_request_queries',
+    'Число SQL-запросов на один запрос',
+    ('view', 'action'),
+    buckets=QUERY_BUCKETS,
+)
+REQUEST_DB_TIME = REGISTRY.histogram(
+    'foodgram_http_request_db_seconds',
+    'Время SQL-запросов одного запроса',
+    ('view', 'action'),
+)
+EXPORT_SIZE = REGISTRY.histogram(
+    'foodgram_shopping_list_export_bytes',
+    'Размер сформированной выгрузки списка покупок',
+    ('format',),
+    buckets=SIZE_BUCKETS,
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    'foodgram_cache_requests_total',
+    'Обращения к кешам: hit - ответ из кеша, miss - пересчет',
+    ('cache', 'result'),
+)
+
+
+def cache_result(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result='hit' if hit else 'miss')
+
+
+def view_labels(request):
+    """Класс представления DRF и действие вьюсета для метода запроса"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', ''
+    cls = getattr(match.func, 'cls', None)
+    if cls is None:
+        return match.view_name or match.func.__name__, ''
+    actions = getattr(match.func, 'actions', None) or {}
+    method = request.method.lower()
+    if method == 'head' and 'head' not in actions:
+        method = 'get'
+    return cls.__name__, actions.get(method, '')
+
+
+class MetricsMiddleware(SyncAndAsyncMiddleware):
+    """Время, число и время SQL-запросов по представлениям и действиям.
+
+    Запросы к базе считает тот же RequestProfile, что и профилирование;
+    если ProfilingMiddleware включена, используется ее профиль.
+    """
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def enter(self, request):
+        profile = current_profile.get()
+        token = None
+        if profile is None:
+            profile = RequestProfile(detailed=False)
+            token = current_profile.set(profile)
+        return profile, token, time.perf_counter()
+
+    def exit(self, state):
+        if state[1] is not None:
+            current_profile.reset(state[1])
+
+    def process_response(self, request, response, state):
+        profile, _, started = state
+        view, action = view_labels(request)
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started,
+            view=view,
+            action=action,
+            method=request.method,
+            status=response.status_code,
+        )
+        REQUEST_QUERIES.observe(profile.query_count, view=view, action=action)
+        REQUEST_DB_TIME.observe(profile.db_time, view=view, action=action)
+        return response
@@ -1,5 +1,95 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def get_recipes_limit(request):
+    """Число рецептов автора в ответе из ?recipes_limit=, 0 - все"""
+    try:
+        return int(request.query_params.get('recipes_limit', 0))
+    except ValueError:
+        raise ValidationError(
+            {'recipes_limit': ['Должно быть целым числом']}
+        )
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPagination(LimitPageNumberPagination):
+    """Keyset-пагинация ленты по (pub_data, id) без OFFSET и COUNT(*)"""
+    cursor_query_param = 'cursor'
+    id_field = 'id'
+    invalid_cursor_message = 'Неверный курсор'
+
+    @property
+    def ordering(self):
+        return ('-pub_data', f'-{self.id_field}')
+
+    def encode_cursor(self, recipe):
+        recipe_id = getattr(recipe, self.id_field)
+        token = f'{recipe.pub_data.isoformat()}|{recipe_id}'
+        return urlsafe_b64encode(token.encode()).decode()
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            pub_data, recipe_id = urlsafe_b64decode(
+                token.encode()
+            ).decode().split('|')
+            pub_data = parse_datetime(pub_data)
+            recipe_id = int(recipe_id)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+        if pub_data is None:
+            raise NotFound(self.invalid_cursor_message)
+        return pub_data, recipe_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.ordering)
+        if cursor is not None:
+            pub_data, recipe_id = cursor
+            # Условие pub_data <= x повторяет OR-ветки, но только оно
+            # дает планировщику границу диапазона индекса по pub_data
+            queryset = queryset.filter(
+                Q(pub_data__lt=pub_data)
+                | Q(pub_data=pub_data, **{f'{self.id_field}__lt': recipe_id}),
+                pub_data__lte=pub_data,
+            )
+        page = list(queryset[:page_size + 1])
+        self.next_recipe = None
+        if len(page) > page_size:
+            self.next_recipe = page[page_size - 1]
+        return page[:page_size]
+
+    def get_next_link(self):
+        if self.next_recipe is None:
+            return None
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param,
+            self.encode_cursor(self.next_recipe)
+        )
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+
+class FeedCursorPagination(RecipeCursorPagination):
+    """Тот же курсор для ленты подписок: строки FeedEntry, ключ recipe_id"""
+    id_field = 'recipe_id'
@@ -1,3 +1,6 @@
+from hmac import compare_digest
+
+from django.conf import settings
 from rest_framework.permissions import BasePermission
 
 
@@ -14,3 +17,16 @@ class IsAuthorOrReadOnly(BasePermission):
             return True
 
         return self.AuthorAccess(request.user, obj) or request.user.is_staff
+
+
+class IsMetricsScraper(BasePermission):
+    """Администратор или сборщик метрик с токеном METRICS_TOKEN"""
+
+    def has_permission(self, request, view):
+        if request.user.is_staff:
+            return True
+        token = settings.METRICS_TOKEN
+        return bool(token) and compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', ''),
+            f'Bearer {token}'
+        )
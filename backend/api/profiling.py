@@ -0,0 +1,185 @@
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from foodgram.middleware import SyncAndAsyncMiddleware
+from rest_framework import serializers
+
+logger = logging.getLogger(__name__)
+
+N_PLUS_ONE_THRESHOLD = 3
+DATA_STATEMENTS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+FIELD_LOOP_CODE = serializers.Serializer.to_representation.__code__
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+def sql_shape(sql):
+    """Запросы, отличающиеся только длиной IN (...), считаются одинаковыми"""
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def serializer_field():
+    """Путь поля сериализатора, при выводе которого выполняется запрос"""
+    path = []
+    frame = sys._getframe(2)
+    while frame is not None:
+        if frame.f_code is FIELD_LOOP_CODE:
+            field = frame.f_locals.get('field')
+            if field is not None:
+                path.append(
+                    f'{type(frame.f_locals["self"]).__name__}.'
+                    f'{field.field_name}'
+                )
+        frame = frame.f_back
+    return ' > '.join(reversed(path)) or None
+
+
+class RequestProfile:
+    """Запросы к базе и время сериализации одного HTTP-запроса.
+
+    С detailed=False (метрики) считаются только число и время запросов:
+    формы запросов и поля сериализаторов для поиска N+1 не собираются.
+    """
+
+    def __init__(self, detailed=True):
+        self.detailed = detailed
+        self.lock = threading.Lock()
+        self.queries = defaultdict(list)
+        self.query_count = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+
+    def record(self, sql, duration, field):
+        with self.lock:
+            self.query_count += 1
+            self.db_time += duration
+            if self.detailed:
+                self.queries[sql_shape(sql)].append(field)
+
+    def repeated(self):
+        """Одинаковые запросы, повторенные N_PLUS_ONE_THRESHOLD раз и больше"""
+        return [
+            {
+                'sql': shape,
+                'count': len(fields),
+                'fields': sorted({field for field in fields if field}),
+            }
+            for shape, fields in self.queries.items()
+            if len(fields) >= N_PLUS_ONE_THRESHOLD
+            and shape.lstrip().upper().startswith(DATA_STATEMENTS)
+        ]
+
+    def server_timing(self, total):
+        metrics = [
+            f'db;dur={self.db_time * 1000:.1f};'
+            f'desc="{self.query_count} queries"',
+            f'serialize;dur={self.serialize_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ]
+        repeated = self.repeated()
+        if repeated:
+            metrics.append(f'n1;desc="{len(repeated)} repeated queries"')
+        return ', '.join(metrics)
+
+
+def profile_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record(
+            sql,
+            time.perf_counter() - started,
+            serializer_field() if profile.detailed else None
+        )
+
+
+def install_profiler(connection, **kwargs):
+    """Подключает учет запросов к соединению при его открытии.
+
+    Профиль запроса берется из контекста, поэтому учитываются и запросы
+    из других потоков: sync_to_async под ASGI и пула асинхронных
+    представлений. Вне профилируемого запроса обертка ничего не делает.
+    """
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+def timed_representation(to_representation):
+    """Считает время внешнего вызова сериализатора, вложенные не суммирует"""
+    @wraps(to_representation)
+    def wrapper(self, instance):
+        profile = current_profile.get()
+        if profile is None or profile.serializing:
+            return to_representation(self, instance)
+        profile.serializing = True
+        started = time.perf_counter()
+        try:
+            return to_representation(self, instance)
+        finally:
+            profile.serialize_time += time.perf_counter() - started
+            profile.serializing = False
+    return wrapper
+
+
+def instrument_serializers():
+    for serializer in (serializers.Serializer, serializers.ListSerializer):
+        serializer.to_representation = timed_representation(
+            serializer.to_representation
+        )
+
+
+class ProfilingMiddleware(SyncAndAsyncMiddleware):
+    """Число и время SQL-запросов, время сериализации и поиск N+1.
+
+    Включается настройкой REQUEST_PROFILING. Итог отдается в заголовке
+    Server-Timing и пишется в лог; повторяющиеся запросы логируются
+    как предупреждение вместе с полем сериализатора, которое их вызвало.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_PROFILING:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def enter(self, request):
+        profile = RequestProfile()
+        return profile, current_profile.set(profile), time.perf_counter()
+
+    def exit(self, state):
+        current_profile.reset(state[1])
+
+    def process_response(self, request, response, state):
+        profile, _, started = state
+        total = time.perf_counter() - started
+        response['Server-Timing'] = profile.server_timing(total)
+        record = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(profile.db_time * 1000, 1),
+            'queries': profile.query_count,
+            'serialize_ms': round(profile.serialize_time * 1000, 1),
+        }
+        logger.info(json.dumps(record, ensure_ascii=False))
+        for repeated in profile.repeated():
+            logger.warning(json.dumps(
+                {**record, 'n_plus_one': repeated},
+                ensure_ascii=False
+            ))
+        return response
@@ -0,0 +1,86 @@
+import threading
+from bisect import bisect_left
+
+from recipes.models import Ingredient
+
+from .catalog import bump_catalog_version, get_catalog_version
+from .metrics import cache_result
+
+SEARCH_LIMIT = 50
+
+
+class IngredientSearchIndex:
+    """Поисковый индекс ингредиентов в памяти воркера.
+
+    Имена хранятся в casefold и отсортированы: совпадения по префиксу
+    находятся бинарным поиском, совпадения внутри имени - проходом по
+    списку. Индекс перестраивается при смене версии справочника
+    ингредиентов, которая берется из базы, поэтому изменения из других
+    процессов тоже подхватываются. Версия, имена и записи хранятся одним
+    неизменяемым кортежем и заменяются целиком, так что параллельный
+    поиск всегда видит согласованный индекс.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = (None, (), ())
+
+    def invalidate(self):
+        bump_catalog_version('ingredients')
+
+    def _ensure(self):
+        version = get_catalog_version('ingredients')
+        index = self._index
+        fresh = index[0] == version
+        cache_result('ingredient_index', fresh)
+        if fresh:
+            return index
+        with self._lock:
+            index = self._index
+            if index[0] == version:
+                return index
+            rows = sorted(
+                (
+                    (row['name'].casefold(), row)
+                    for row in Ingredient.objects.values(
+                        'id',
+                        'name',
+                        'measurement_unit'
+                    )
+                ),
+                key=lambda entry: (entry[0], entry[1]['id'])
+            )
+            index = (
+                version,
+                tuple(name for name, _ in rows),
+                tuple(row for _, row in rows),
+            )
+            self._index = index
+        return index
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Сначала совпадения по префиксу, затем по вхождению"""
+        _, names, items = self._ensure()
+        query = query.strip().casefold()
+        if not query:
+            return []
+        found = []
+        start = bisect_left(names, query)
+        end = start
+        while (
+            end < len(names)
+            and names[end].startswith(query)
+            and len(found) < limit
+        ):
+            found.append(items[end])
+            end += 1
+        for index, name in enumerate(names):
+            if len(found) >= limit:
+                break
+            if start <= index < end or query not in name:
+                continue
+            found.append(items[index])
+        return found
+
+
+ingredient_index = IngredientSearchIndex()
@@ -1,12 +1,15 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models import prefetch_related_objects
 
+from recipes.constant import BULK_LIMIT
 from recipes.models import Ingredient, IngredientsRecipe, Recipe, Tag
 from recipes.validators import DataValidationHelpers
 from users.serializers import ExtendedUserSerializer
-from users.utils import (BaseFielsSerializer, CustomRecipeFieldsSerializer,
-                         ExtendedImageField,
+from users.utils import (BaseFielsSerializer, BulkPrimaryKeyRelatedField,
+                         CustomRecipeFieldsSerializer, ExtendedImageField,
+                         ImageDerivativesField,
                          RecipeIngredientsExtendedSerializer)
 
 from .decorators import (recipe_create_decorator, recipe_update_decorator,
@@ -22,12 +25,14 @@ class TagSerializer(BaseFielsSerializer):
     """Сериализатор тэгов"""
     class Meta(BaseFielsSerializer.Meta):
         model = Tag
+        fields = ('id', 'name', 'color', 'slug')
 
 
 class IngredientSerializer(BaseFielsSerializer):
     """Сериализатор ингредиентов"""
     class Meta(BaseFielsSerializer.Meta):
         model = Ingredient
+        fields = ('id', 'name', 'measurement_unit')
 
 
 class IngredientsRecipeSerializer(RecipeIngredientsExtendedSerializer):
@@ -42,13 +47,18 @@ class IngredientsRecipeSerializer(RecipeIngredientsExtendedSerializer):
         )
 
 
+class CreateIngredientsRecipeListSerializer(serializers.ListSerializer):
+    """Проверяет существование всех ингредиентов одним запросом"""
+
+    def to_internal_value(self, data):
+        return DataValidationHelpers.validate_ids(
+            super().to_internal_value(data)
+        )
+
+
 class CreateIngredientsRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор добавления ингредиентов в рецепт"""
-    id = serializers.IntegerField(
-        validators=[
-            DataValidationHelpers.validate_id
-        ]
-    )
+    id = serializers.IntegerField()
     amount = serializers.IntegerField(
         validators=[
             MinValueValidator(MIN_AMOUNT),
@@ -58,6 +68,7 @@ class CreateIngredientsRecipeSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = IngredientsRecipe
+        list_serializer_class = CreateIngredientsRecipeListSerializer
         fields = (
             'id',
             'amount',
@@ -77,6 +88,7 @@ class RecipeSerializer(
         valid_formats=['jpg', 'jpeg', 'png'],
         max_size=MAX_FILE_SIZE
     )
+    images = ImageDerivativesField(source='image')
     tags = TagSerializer(many=True)
     author = ExtendedUserSerializer(read_only=True)
 
@@ -86,6 +98,7 @@ class RecipeSerializer(
             'id',
             'name',
             'image',
+            'images',
             'text',
             'tags',
             'author',
@@ -103,13 +116,23 @@ class SnippetRecipeSerializer(RecipeSerializer):
             'id',
             'name',
             'image',
+            'images',
             'cooking_time',
         )
 
 
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для массового добавления или удаления"""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=BULK_LIMIT,
+    )
+
+
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """Сериализатор добавления и обновления рецепта"""
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -139,6 +162,10 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            *RelatedObjectManager.load_plan(self.context['request'].user)
+        )
         serializer = RecipeSerializer(instance, context=self.context)
         return serializer.data
 
@@ -169,9 +196,8 @@ class SubscrimeSerializer(ExtendedUserSerializer):
     def get_recipes(self, instance, serialized_data):
         return serialized_data
 
-    @recipes_decorator(SnippetRecipeSerializer)
-    def get_recipes_count(self, instance, serializer):
-        return instance.recipes.count()
+    def get_recipes_count(self, instance):
+        return instance.recipes_count
 
     class Meta:
         model = get_user_model()
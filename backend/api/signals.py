@@ -0,0 +1,116 @@
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from jobs.queue import enqueue
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Subscrime
+
+from .catalog import bump_catalog_version
+from .exports import bump_cart_version
+from .managers import CounterManager, FeedManager, ShoppingListAggregator
+from .search import ingredient_index
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def invalidate_tags(**kwargs):
+    bump_catalog_version('tags')
+
+
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def invalidate_shopping_list(instance, **kwargs):
+    bump_cart_version(instance.user_id)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(instance, created, **kwargs):
+    if created:
+        ShoppingListAggregator.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_shopping_list(instance, **kwargs):
+    ShoppingListAggregator.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscrime)
+@receiver(post_save, sender=Recipe)
+def increase_counters(sender, instance, created, **kwargs):
+    if created:
+        CounterManager.on_change(sender, [instance], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscrime)
+@receiver(post_delete, sender=Recipe)
+def decrease_counters(sender, instance, **kwargs):
+    CounterManager.on_change(sender, [instance], -1)
+
+
+@receiver(post_save, sender=Recipe)
+def build_image_derivatives(instance, update_fields, **kwargs):
+    if update_fields is not None and 'image' not in update_fields:
+        return
+    if instance.image and instance.image_changed():
+        enqueue('build_image_derivatives', image=instance.image.name)
+    instance.stored_image = instance.image.name
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        enqueue('fan_out_recipe', recipe_id=instance.id)
+
+
+@receiver(post_save, sender=Subscrime)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        FeedManager.backfill(instance.user_id, [instance.author_id])
+
+
+@receiver(post_delete, sender=Subscrime)
+def forget_feed(instance, **kwargs):
+    FeedManager.forget(instance.user_id, [instance.author_id])
+
+
+def list_entries_changed(model, user_id, recipe_ids, delta):
+    """То же, что обработчики выше, для массовых вставок и удалений"""
+    if not recipe_ids:
+        return
+    CounterManager.on_change(
+        model,
+        [model(user_id=user_id, recipe_id=recipe_id)
+         for recipe_id in recipe_ids],
+        delta
+    )
+    if model is ShoppingCart:
+        if delta > 0:
+            ShoppingListAggregator.add_recipe(user_id, *recipe_ids)
+        else:
+            ShoppingListAggregator.remove_recipe(user_id, *recipe_ids)
+        bump_cart_version(user_id)
+
+
+def subscriptions_changed(user_id, author_ids, delta):
+    if not author_ids:
+        return
+    CounterManager.on_change(
+        Subscrime,
+        [Subscrime(user_id=user_id, author_id=author_id)
+         for author_id in author_ids],
+        delta
+    )
+    if delta > 0:
+        FeedManager.backfill(user_id, author_ids)
+    else:
+        FeedManager.forget(user_id, author_ids)
@@ -0,0 +1,45 @@
+from django.utils import timezone
+
+from jobs.queue import task
+from recipes.constant import User
+from recipes.models import Recipe
+from recipes.storage import ImageDerivatives
+
+from .exports import EXPORT_FORMATS, ShoppingListExport
+from .managers import CounterManager, FeedManager
+
+
+@task('build_image_derivatives')
+def build_image_derivatives(image):
+    """Создает копии картинки и меняет updated_at ее рецептов.
+
+    Поле images в ответе зависит от готовых копий, поэтому ETag и
+    Last-Modified рецептов должны смениться, когда копии появились.
+    """
+    if ImageDerivatives(image).build():
+        Recipe.objects.filter(image=image).update(updated_at=timezone.now())
+
+
+@task('reconcile_counters')
+def reconcile_counters():
+    CounterManager.reconcile()
+
+
+@task('fan_out_recipe')
+def fan_out_recipe(recipe_id):
+    FeedManager.fan_out(recipe_id)
+
+
+@task('render_shopping_list')
+def render_shopping_list(user_id, version=None):
+    """Готовит выгрузки списка покупок под текущую версию корзины.
+
+    Если корзина менялась несколько раз, первая задача подготовит
+    файлы, а остальные найдут их в кеше. version остался от задач,
+    поставленных до хранения версии в базе, и не используется.
+    """
+    user = User.objects.filter(id=user_id).first()
+    if user is None:
+        return
+    for file_format in EXPORT_FORMATS:
+        ShoppingListExport(user, file_format).prepare()
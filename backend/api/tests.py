@@ -0,0 +1,826 @@
+import asyncio
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.base import BaseHandler
+from django.db import connection
+from django.db.models import F
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import (APIClient, APIRequestFactory,
+                                 force_authenticate)
+
+from api.async_views import (RecipeDetailView, RecipeListView,
+                             SubscriptionsView)
+from api.catalog import CATALOG_VERSION_KEY
+from api.managers import CounterManager, ShoppingListAggregator
+from api.metrics import ARCHIVE_NAME, MetricsRegistry, write_json
+from api.profiling import (N_PLUS_ONE_THRESHOLD, RequestProfile,
+                           current_profile, install_profiler)
+from api.search import IngredientSearchIndex
+from api.tasks import build_image_derivatives
+from jobs.models import Job
+from jobs.queue import claim, run
+from recipes.models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
+                            RecipeTag, ShoppingCart, ShoppingListItem, Tag)
+from users.models import CustomUser, Subscrime
+
+AUTHORS = 12
+RECIPES_PER_AUTHOR = 6
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username,
+        email=f'{username}@example.com',
+        password='password',
+        first_name=username,
+        last_name=username,
+    )
+
+
+class QueryCountTestCase(TestCase):
+    """Число SQL-запросов не зависит от размера страницы"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        authors = [create_user(f'author{number}') for number in range(AUTHORS)]
+        tags = [
+            Tag.objects.create(
+                name=f'Тег {number}',
+                color=f'#00000{number}',
+                slug=f'tag{number}',
+            )
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}',
+                measurement_unit='г',
+            )
+            for number in range(8)
+        ]
+        for number in range(AUTHORS * RECIPES_PER_AUTHOR):
+            recipe = Recipe.objects.create(
+                author=authors[number % AUTHORS],
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            RecipeTag.objects.bulk_create(
+                RecipeTag(recipe=recipe, tag=tag)
+                for tag in tags[:1 + number % len(tags)]
+            )
+            IngredientsRecipe.objects.bulk_create(
+                IngredientsRecipe(
+                    recipe=recipe,
+                    ingredient=ingredient,
+                    amount=10 + index,
+                )
+                for index, ingredient in enumerate(
+                    ingredients[:1 + number % len(ingredients)]
+                )
+            )
+            if number % 2:
+                Favorite.objects.create(user=cls.reader, recipe=recipe)
+            if number % 3:
+                ShoppingCart.objects.create(user=cls.reader, recipe=recipe)
+        for author in authors:
+            Subscrime.objects.create(user=cls.reader, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context)
+
+    def assert_same_queries(self, small, large, results):
+        # Версии справочников в ETag кешируются после первого запроса
+        self.count_queries(large)
+        expected = self.count_queries(small)
+        with self.assertNumQueries(expected):
+            response = self.client.get(large)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), results)
+
+    def test_recipe_list(self):
+        self.assert_same_queries(
+            '/api/recipes/?limit=6', '/api/recipes/?limit=50', 50
+        )
+
+    def test_anonymous_recipe_list(self):
+        self.client.force_authenticate(None)
+        self.assert_same_queries(
+            '/api/recipes/?limit=6', '/api/recipes/?limit=50', 50
+        )
+
+    def test_subscriptions(self):
+        self.assert_same_queries(
+            '/api/users/subscriptions/?limit=2&recipes_limit=1',
+            '/api/users/subscriptions/?limit=12',
+            AUTHORS,
+        )
+
+
+class IngredientSearchIndexTestCase(TestCase):
+    """Поиск ингредиентов по индексу в памяти"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit='г')
+            for name in ('Сахар', 'соль', 'морская соль', 'мука')
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.index = IngredientSearchIndex()
+
+    def names(self, query):
+        return [row['name'] for row in self.index.search(query)]
+
+    def test_prefix_matches_go_first(self):
+        self.assertEqual(self.names('со'), ['соль', 'морская соль'])
+        self.assertEqual(self.names('СА'), ['Сахар'])
+        self.assertEqual(self.names(' '), [])
+
+    def test_invalidate_keeps_index_searchable(self):
+        self.names('со')
+        self.index.invalidate()
+        self.assertEqual(self.names('му'), ['мука'])
+
+    def test_changes_from_another_process(self):
+        self.names('со')
+        # bulk_create не шлет сигналы, как и изменения в другом процессе:
+        # версия обновится, когда истечет ее срок в кеше
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='сода', measurement_unit='г')]
+        )
+        cache.delete(CATALOG_VERSION_KEY.format(catalog='ingredients'))
+        self.assertEqual(self.names('со'), ['сода', 'соль', 'морская соль'])
+
+
+class ShoppingListAggregatorTestCase(TestCase):
+    """Сводный список покупок следует за корзиной"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.salt, cls.sugar, cls.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'сахар', 'мука')
+        )
+        cls.bread = cls.create_recipe({cls.salt: 5, cls.flour: 500})
+        cls.cake = cls.create_recipe({cls.sugar: 200, cls.flour: 300})
+
+    @classmethod
+    def create_recipe(cls, amounts):
+        recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        IngredientsRecipe.objects.bulk_create(
+            IngredientsRecipe(
+                recipe=recipe,
+                ingredient=ingredient,
+                amount=amount
+            )
+            for ingredient, amount in amounts.items()
+        )
+        return recipe
+
+    def totals(self):
+        return {
+            ingredient_id: total
+            for (_, ingredient_id), total
+            in ShoppingListAggregator.stored_totals([self.user.id]).items()
+        }
+
+    def test_add_and_remove(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.bread)
+        ShoppingCart.objects.create(user=self.user, recipe=self.cake)
+        self.assertEqual(self.totals(), {
+            self.salt.id: 5,
+            self.sugar.id: 200,
+            self.flour.id: 800,
+        })
+        ShoppingCart.objects.get(user=self.user, recipe=self.bread).delete()
+        self.assertEqual(
+            self.totals(),
+            {self.sugar.id: 200, self.flour.id: 300}
+        )
+        ShoppingCart.objects.get(user=self.user, recipe=self.cake).delete()
+        self.assertEqual(self.totals(), {})
+
+    def test_add_to_concurrently_created_item(self):
+        # Строку успел вставить параллельный запрос
+        ShoppingListItem.objects.create(
+            user=self.user,
+            ingredient=self.flour,
+            total_amount=300
+        )
+        ShoppingListAggregator.add_recipe(self.user.id, self.bread.id)
+        self.assertEqual(self.totals(), {self.salt.id: 5, self.flour.id: 800})
+
+    def test_rebuild(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.bread)
+        ShoppingCart.objects.create(user=self.user, recipe=self.cake)
+        ShoppingListItem.objects.filter(ingredient=self.flour).update(
+            total_amount=1
+        )
+        ShoppingListItem.objects.filter(ingredient=self.salt).delete()
+        self.assertEqual(
+            ShoppingListAggregator.drifted_users([self.user.id]),
+            {self.user.id}
+        )
+        ShoppingListAggregator.rebuild([self.user.id])
+        self.assertEqual(ShoppingListAggregator.drifted_users(), set())
+        self.assertEqual(self.totals()[self.flour.id], 800)
+
+
+class RelationApiTestCase(TestCase):
+    """Избранное, корзина и подписки через API не сдвигают счетчики"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('buyer')
+        cls.author = create_user('author')
+        salt, flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука')
+        )
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author,
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            IngredientsRecipe.objects.bulk_create([
+                IngredientsRecipe(recipe=recipe, ingredient=salt, amount=5),
+                IngredientsRecipe(recipe=recipe, ingredient=flour, amount=500),
+            ])
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_consistent(self):
+        self.assertEqual(
+            set(CounterManager.reconcile(check=True).values()),
+            {0}
+        )
+        self.assertEqual(ShoppingListAggregator.drifted_users(), set())
+
+    def assert_status(self, method, url, expected, data=None):
+        response = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(response.status_code, expected, response.data)
+        self.assert_consistent()
+        return response
+
+    def test_single_add_and_remove(self):
+        recipe = self.recipes[0]
+        for action in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{recipe.id}/{action}/'
+            with self.subTest(action=action):
+                self.assert_status('post', url, 201)
+                self.assert_status('post', url, 400)
+                self.assert_status('delete', url, 204)
+                self.assert_status('delete', url, 400)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.favorites_count, 0)
+        self.assertEqual(recipe.in_carts_count, 0)
+
+    def test_bulk_add_and_remove(self):
+        ids = [recipe.id for recipe in self.recipes]
+        missing = max(ids) + 1
+        for action in ('bulk_favorite', 'bulk_shopping_cart'):
+            url = f'/api/recipes/{action}/'
+            with self.subTest(action=action):
+                self.assert_status('post', url, 200, {'recipes': ids[:1]})
+                response = self.assert_status(
+                    'post', url, 200, {'recipes': ids + [missing]}
+                )
+                self.assertEqual(
+                    [item['status'] for item in response.data['results']],
+                    ['exists', 'added', 'not_found']
+                )
+                response = self.assert_status(
+                    'delete', url, 200, {'recipes': ids}
+                )
+                self.assertEqual(
+                    [item['status'] for item in response.data['results']],
+                    ['removed', 'removed']
+                )
+                self.assert_status('delete', url, 200, {'recipes': ids})
+        for recipe in Recipe.objects.all():
+            self.assertEqual(recipe.favorites_count, 0)
+            self.assertEqual(recipe.in_carts_count, 0)
+
+    def test_subscribe_and_unsubscribe(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        self.assert_status('post', url, 201)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 1)
+        self.assert_status('post', url, 400)
+        self.assert_status('delete', url, 204)
+        self.assert_status('delete', url, 400)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, 0)
+
+    def test_self_subscription_is_rejected(self):
+        url = f'/api/users/{self.user.id}/'
+        self.assert_status('post', f'{url}subscribe/', 400)
+        self.assertFalse(Subscrime.objects.exists())
+        self.assertFalse(self.client.get(url).data['is_subscribed'])
+
+
+class FeedApiTestCase(TestCase):
+    """Лента подписок: дозаполнение, fan-out и keyset-курсор"""
+    URL = '/api/recipes/feed/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = create_user('reader')
+        cls.author = create_user('author')
+        cls.other = create_user('other')
+        cls.recipes = [
+            cls.create_recipe(author, number)
+            for number, author in enumerate([cls.author] * 5 + [cls.other])
+        ]
+        # Одинаковое время публикации: порядок задает id
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in cls.recipes[1:3]]
+        ).update(pub_data=cls.recipes[1].pub_data)
+        Job.objects.all().delete()
+
+    @classmethod
+    def create_recipe(cls, author, number):
+        return Recipe.objects.create(
+            author=author,
+            name=f'Рецепт {number}',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10,
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def subscribe(self, method, author, expected):
+        self.assertEqual(
+            getattr(self.client, method)(
+                f'/api/users/{author.id}/subscribe/'
+            ).status_code,
+            expected
+        )
+
+    def feed_ids(self, url=URL):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def expected_ids(self, *authors):
+        return list(
+            Recipe.objects.filter(author__in=authors)
+            .order_by('-pub_data', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_backfill_on_follow_and_forget_on_unfollow(self):
+        self.assertEqual(self.feed_ids(), [])
+        self.subscribe('post', self.author, 201)
+        self.assertEqual(self.feed_ids(), self.expected_ids(self.author))
+        self.subscribe('post', self.other, 201)
+        self.assertEqual(
+            self.feed_ids(),
+            self.expected_ids(self.author, self.other)
+        )
+        self.subscribe('delete', self.author, 204)
+        self.assertEqual(self.feed_ids(), self.expected_ids(self.other))
+
+    def test_fan_out_job(self):
+        self.subscribe('post', self.author, 201)
+        recipe = self.create_recipe(self.author, 'новый')
+        self.assertNotIn(recipe.id, self.feed_ids())
+        jobs = [
+            job for job in claim(batch_size=10)
+            if job.name == 'fan_out_recipe'
+        ]
+        self.assertEqual(len(jobs), 1)
+        self.assertTrue(run(jobs[0]))
+        self.assertEqual(self.feed_ids()[0], recipe.id)
+        self.assertEqual(self.feed_ids(), self.expected_ids(self.author))
+        self.assertFalse(
+            Job.objects.filter(name='fan_out_recipe').exists()
+        )
+
+    def test_keyset_cursor(self):
+        self.subscribe('post', self.author, 201)
+        self.subscribe('post', self.other, 201)
+        ids = []
+        url = f'{self.URL}?limit=2&cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertLessEqual(len(response.data['results']), 2)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, self.expected_ids(self.author, self.other))
+        self.assertEqual(
+            self.client.get(f'{self.URL}?cursor=abc').status_code,
+            404
+        )
+
+
+class RecipeConditionalTestCase(TestCase):
+    """Условные GET рецептов для анонимов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.recipes = [
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_list_is_validated_by_etag_only(self):
+        response = self.client.get('/api/recipes/')
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(
+            self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+            .status_code,
+            304
+        )
+        self.recipes[0].delete()
+        response = self.client.get('/api/recipes/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_detail_last_modified(self):
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            .status_code,
+            304
+        )
+
+    def test_validators_change_when_derivatives_are_built(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1200), 'red').save(buffer, 'PNG')
+        image = default_storage.save(
+            self.recipes[0].image.name,
+            ContentFile(buffer.getvalue())
+        )
+        Recipe.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        url = f'/api/recipes/{self.recipes[0].id}/'
+        response = self.client.get(url)
+        self.assertIsNone(response.data['images'])
+        etag = response['ETag']
+        last_modified = response['Last-Modified']
+        build_image_derivatives(image)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data['images'])
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+            .status_code,
+            200
+        )
+
+
+class ImageDerivativesJobTestCase(TestCase):
+    """Копии картинки пересобираются только при ее замене"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.recipe = Recipe.objects.create(
+            author=create_user('cook'),
+            name='Рецепт',
+            image='recipes/images/first.png',
+            text='Описание',
+            cooking_time=10,
+        )
+
+    def jobs(self):
+        return list(
+            Job.objects.filter(name='build_image_derivatives')
+            .order_by('id')
+            .values_list('payload__image', flat=True)
+        )
+
+    def test_enqueued_on_create_and_image_change(self):
+        self.assertEqual(self.jobs(), ['recipes/images/first.png'])
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        recipe.name = 'Новое название'
+        recipe.save()
+        recipe.cooking_time = 20
+        recipe.save(update_fields=('cooking_time',))
+        Recipe.objects.only('name').get(pk=recipe.pk).save()
+        self.assertEqual(len(self.jobs()), 1)
+        recipe.image = 'recipes/images/second.png'
+        recipe.save()
+        recipe.save()
+        self.assertEqual(self.jobs(), [
+            'recipes/images/first.png',
+            'recipes/images/second.png',
+        ])
+
+
+class MetricsRegistryTestCase(SimpleTestCase):
+    """Файлы завершившихся процессов сворачиваются в архив без потерь"""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        settings = override_settings(METRICS_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def create_registry(self):
+        registry = MetricsRegistry()
+        return registry, registry.counter('test_total', 'Тест', ('kind',))
+
+    def total(self, registry):
+        return registry.collect()['test_total'][('a',)]
+
+    def files(self):
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.endswith('.json')
+        )
+
+    def test_dead_and_retired_processes_are_archived(self):
+        registry, counter = self.create_registry()
+        counter.inc(2, kind='a')
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        write_json(
+            os.path.join(self.directory, f'{process.pid}-dead.json'),
+            {'test_total': [[['a'], 3]]}
+        )
+        self.assertEqual(self.total(registry), 5)
+        self.assertEqual(len(self.files()), 2)
+        self.assertIn(ARCHIVE_NAME, self.files())
+        self.assertEqual(self.total(registry), 5)
+        registry.retire()
+        self.assertEqual(self.files(), [ARCHIVE_NAME])
+        registry, _ = self.create_registry()
+        self.assertEqual(self.total(registry), 5)
+
+
+class RequestProfileTestCase(TestCase):
+    """Учет запросов для профилирования и метрик"""
+
+    def run_queries(self, profile):
+        install_profiler(connection)
+        token = current_profile.set(profile)
+        try:
+            for number in range(N_PLUS_ONE_THRESHOLD):
+                list(Tag.objects.filter(id__in=range(number + 1)))
+        finally:
+            current_profile.reset(token)
+        return profile
+
+    def test_detailed_profile_finds_repeated_queries(self):
+        profile = self.run_queries(RequestProfile())
+        self.assertEqual(profile.query_count, N_PLUS_ONE_THRESHOLD)
+        self.assertEqual(len(profile.repeated()), 1)
+
+    def test_metrics_profile_only_counts(self):
+        profile = self.run_queries(RequestProfile(detailed=False))
+        self.assertEqual(profile.query_count, N_PLUS_ONE_THRESHOLD)
+        self.assertEqual(profile.queries, {})
+        self.assertGreater(profile.db_time, 0)
+
+
+class MiddlewareModeTestCase(SimpleTestCase):
+    """Под ASGI ни одна middleware не переводится в синхронный поток.
+
+    Методы process_view Django адаптирует отдельно, в цепочке вызовов
+    они не участвуют, поэтому проверяются только сами middleware.
+    """
+
+    @override_settings(REQUEST_PROFILING=True, METRICS_ENABLED=True)
+    def test_asgi_handler_does_not_adapt_middleware(self):
+        adapt = BaseHandler.adapt_method_mode
+        adapted = []
+
+        def record(handler, is_async, method, method_is_async=None,
+                   debug=False, name=None):
+            if method_is_async is None:
+                method_is_async = asyncio.iscoroutinefunction(method)
+            if name is not None and is_async != method_is_async:
+                adapted.append(name)
+            return adapt(
+                handler, is_async, method, method_is_async, debug, name
+            )
+
+        with mock.patch.object(BaseHandler, 'adapt_method_mode', record):
+            handler = ASGIHandler()
+        self.assertEqual(adapted, [])
+        self.assertTrue(
+            asyncio.iscoroutinefunction(handler._middleware_chain)
+        )
+
+
+class ShoppingListExportTestCase(TestCase):
+    """Выгрузка списка покупок из кеша по версии корзины"""
+    URL = '/api/recipes/download_shopping_cart/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('shopper')
+        cls.salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        recipe = Recipe.objects.create(
+            author=cls.user,
+            name='Рецепт',
+            image='recipes/images/test.png',
+            text='Описание',
+            cooking_time=10,
+        )
+        IngredientsRecipe.objects.create(
+            recipe=recipe,
+            ingredient=cls.salt,
+            amount=5
+        )
+        ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_cart_change_in_another_process(self):
+        self.assertEqual(self.download(), 'соль- 5- г\n')
+        # Другой воркер меняет корзину: его кеш этому процессу не виден,
+        # но версия корзины в базе меняется
+        ShoppingListItem.objects.filter(user=self.user).update(
+            total_amount=7
+        )
+        self.assertEqual(self.download(), 'соль- 5- г\n')
+        CustomUser.objects.filter(pk=self.user.pk).update(
+            cart_revision=F('cart_revision') + 1
+        )
+        self.assertEqual(self.download(), 'соль- 7- г\n')
+
+    def render_jobs(self):
+        ShoppingCart.objects.filter(user=self.user).delete()
+        return Job.objects.filter(name='render_shopping_list').count()
+
+    def test_render_is_not_queued_for_process_local_cache(self):
+        self.assertEqual(self.render_jobs(), 0)
+
+    def test_render_is_queued_for_shared_cache(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.assertEqual(self.render_jobs(), 1)
+
+
+class AsyncReadViewsTestCase(TransactionTestCase):
+    """Асинхронные представления отвечают так же, как синхронный вьюсет.
+
+    Запросы выполняются в потоках пула со своими соединениями, поэтому
+    данные должны быть закоммичены: TestCase держит их в транзакции.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.factory = APIRequestFactory()
+        self.reader = create_user('reader')
+        author = create_user('author')
+        self.recipes = [
+            Recipe.objects.create(
+                author=author,
+                name=f'Рецепт {number}',
+                image='recipes/images/test.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for number in range(3)
+        ]
+        Favorite.objects.create(user=self.reader, recipe=self.recipes[0])
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipes[1])
+        Subscrime.objects.create(user=self.reader, author=author)
+
+    def get(self, view, url, user=None, **kwargs):
+        request = self.factory.get(url, **kwargs.pop('headers', {}))
+        if user is not None:
+            force_authenticate(request, user)
+        if asyncio.iscoroutinefunction(view):
+            view = async_to_sync(view)
+        return view(request, **kwargs)
+
+    def assert_same_responses(self, view_class, url, user=None, **kwargs):
+        sync_view = view_class.viewset.as_view(
+            view_class.actions,
+            **view_class.initkwargs()
+        )
+        async_view = view_class.as_view()
+        # Первым идет асинхронный запрос: версии справочников для ETag
+        # еще не в кеше и читаются из базы
+        response = self.get(async_view, url, user, **kwargs)
+        expected = self.get(sync_view, url, user, **kwargs)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.data, expected.data)
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        return sync_view, async_view, response
+
+    def assert_not_modified(self, view_class, url, user=None, **kwargs):
+        sync_view, async_view, response = self.assert_same_responses(
+            view_class, url, user, **kwargs
+        )
+        self.assertEqual(response.status_code, 200)
+        headers = {'HTTP_IF_NONE_MATCH': response['ETag']}
+        for view in (sync_view, async_view):
+            with self.subTest(view=view):
+                self.assertEqual(
+                    self.get(view, url, user, headers=headers, **kwargs)
+                    .status_code,
+                    304
+                )
+
+    def test_recipe_list(self):
+        for user in (None, self.reader):
+            with self.subTest(user=user):
+                self.assert_not_modified(
+                    RecipeListView, '/api/recipes/?limit=2', user
+                )
+
+    def test_recipe_detail(self):
+        for recipe in self.recipes[:2]:
+            with self.subTest(recipe=recipe.id):
+                self.assert_not_modified(
+                    RecipeDetailView,
+                    f'/api/recipes/{recipe.id}/',
+                    self.reader,
+                    pk=str(recipe.id)
+                )
+
+    def test_subscriptions(self):
+        self.assert_same_responses(
+            SubscriptionsView,
+            '/api/users/subscriptions/?recipes_limit=1',
+            self.reader
+        )
+
+    def test_invalid_recipes_limit(self):
+        *_, response = self.assert_same_responses(
+            SubscriptionsView,
+            '/api/users/subscriptions/?recipes_limit=abc',
+            self.reader
+        )
+        self.assertEqual(response.status_code, 400)
@@ -1,8 +1,9 @@
-from django.urls import include, path
+from django.conf import settings
+from django.urls import include, path, re_path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (CustomUserViewSet, IngredientViewSet, RecipeViewSet,
-                       TagViewSet)
+from api.views import (CustomUserViewSet, IngredientViewSet, MetricsView,
+                       RecipeViewSet, TagViewSet)
 
 app_name = 'api'
 router = DefaultRouter()
@@ -11,7 +12,21 @@ router.register('tags', TagViewSet)
 router.register('ingredients', IngredientViewSet)
 router.register('recipes', RecipeViewSet)
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_READ_VIEWS:
+    from api.async_views import (IngredientSearchView, RecipeDetailView,
+                                 RecipeListView, SubscriptionsView)
+
+    urlpatterns += [
+        re_path(r'^recipes/$', RecipeListView.as_view()),
+        re_path(r'^recipes/(?P<pk>\d+)/$', RecipeDetailView.as_view()),
+        re_path(r'^users/subscriptions/$', SubscriptionsView.as_view()),
+        re_path(r'^ingredients/$', IngredientSearchView.as_view()),
+    ]
+
+urlpatterns += [
+    path('metrics', MetricsView.as_view(), name='metrics'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
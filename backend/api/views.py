@@ -1,27 +1,38 @@
 from django.contrib.auth import get_user_model
-from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.http import HttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import (IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from api.filters import IngredientsFilter, RecipeFilter
-from api.pagination import LimitPageNumberPagination
-from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (IngredientSerializer,
+from api.filters import RecipeFilter
+from api.pagination import (FeedCursorPagination, LimitPageNumberPagination,
+                            RecipeCursorPagination, get_recipes_limit)
+from api.permissions import IsAuthorOrReadOnly, IsMetricsScraper
+from api.serializers import (BulkRecipesSerializer, IngredientSerializer,
                              RecipeCreateUpdateSerializer, RecipeSerializer,
                              SnippetRecipeSerializer, SubscrimeSerializer,
                              TagSerializer)
 
-from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
+                            ShoppingCart, Tag)
 from users.serializers import ExtendedUserSerializer
 
-from .decorators import (sf_action_decorator, subscribe_decorator,
+from .conditional import RecipeValidators
+from .decorators import (catalog_cache_decorator, sf_action_decorator,
+                         sf_bulk_action_decorator, subscribe_decorator,
                          subscriptions_decorator)
-from .managers import RelatedObjectManager
+from .exports import EXPORT_FORMATS, ShoppingListExport
+from .managers import RelatedObjectManager, RelationWriter
+from .metrics import CONTENT_TYPE, REGISTRY
+from .search import ingredient_index
+from .signals import list_entries_changed
 
 CustomUser = get_user_model()
 
@@ -31,12 +42,23 @@ class TagViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = TagSerializer
     pagination_class = None
 
+    @catalog_cache_decorator('tags')
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     pagination_class = None
-    filter_backends = [IngredientsFilter]
+    filter_backends = []
+
+    @catalog_cache_decorator('ingredients')
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
 
 
 class CustomUserViewSet(UserViewSet):
@@ -44,6 +66,12 @@ class CustomUserViewSet(UserViewSet):
     serializer_class = ExtendedUserSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, ]
 
+    def get_queryset(self):
+        return RelatedObjectManager.annotate_is_subscribed(
+            super().get_queryset(),
+            self.request.user
+        )
+
     @action(
         detail=True,
         methods=['POST', 'DELETE'],
@@ -60,10 +88,16 @@ class CustomUserViewSet(UserViewSet):
     )
     @subscriptions_decorator
     def subscriptions(self, request):
-        user = CustomUser.objects.all()
-        data_source = user.filter(sub_fun__user=self.request.user)
-        sub_serializer = SubscrimeSerializer(
+        data_source = RelatedObjectManager.annotate_is_subscribed(
+            CustomUser.objects.filter(subscrime__user=request.user),
+            request.user
+        ).order_by('id')
+        authors = RelatedObjectManager.prefetch_limited_recipes(
             self.paginate_queryset(data_source),
+            get_recipes_limit(request)
+        )
+        sub_serializer = SubscrimeSerializer(
+            authors,
             context={'request': request},
             many=True,
         )
@@ -82,6 +116,69 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateUpdateSerializer
         return RecipeSerializer
 
+    @property
+    def paginator(self):
+        """?cursor= включает keyset-пагинацию для бесконечной ленты"""
+        if not hasattr(self, '_paginator'):
+            cursor_class = (
+                FeedCursorPagination
+                if self.action == 'feed'
+                else RecipeCursorPagination
+            )
+            self._paginator = (
+                cursor_class()
+                if cursor_class.cursor_query_param
+                in self.request.query_params
+                else self.pagination_class()
+            )
+        return self._paginator
+
+    def get_queryset(self):
+        queryset = RelatedObjectManager.apply_load_plan(
+            super().get_queryset(),
+            self.action,
+            self.request.user
+        )
+        return RelatedObjectManager.annotate_recipe_flags(
+            queryset,
+            self.request.user
+        )
+
+    def get_page_state(self):
+        page = getattr(self.paginator, 'page', None)
+        return (
+            self.paginator.get_next_link(),
+            page.paginator.count if page is not None else None,
+        )
+
+    def list(self, request, *args, **kwargs):
+        validators = RecipeValidators(request)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(validators.light_queryset(queryset))
+        etag = validators.get_etag(page, *self.get_page_state())
+        response = validators.not_modified(etag)
+        if response is None:
+            recipes = queryset.in_bulk([recipe.id for recipe in page])
+            serializer = self.get_serializer(
+                [recipes[item.id] for item in page if item.id in recipes],
+                many=True
+            )
+            response = self.get_paginated_response(serializer.data)
+        return validators.finalize(response, etag)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = RecipeValidators(request)
+        recipe = get_object_or_404(
+            validators.light_queryset(self.get_queryset()),
+            pk=kwargs['pk']
+        )
+        etag = validators.get_etag([recipe])
+        last_modified = validators.get_last_modified(recipe)
+        response = validators.not_modified(etag, last_modified)
+        if response is None:
+            response = super().retrieve(request, *args, **kwargs)
+        return validators.finalize(response, etag, last_modified)
+
     def create_object(self, request, model, recipe_id):
         try:
             recipe_unit = Recipe.objects.get(id=recipe_id)
@@ -90,17 +187,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'Рецепт не найден',
                 status.HTTP_400_BAD_REQUEST
             )
-        existing_obj = model.objects.filter(
-            user=request.user,
-            recipe=recipe_unit
-        ).first()
-        if existing_obj:
+        with transaction.atomic(savepoint=False):
+            added = RelationWriter.insert(
+                model,
+                [{'user_id': request.user.id, 'recipe_id': recipe_unit.id}],
+                'recipe_id'
+            )
+            list_entries_changed(model, request.user.id, added, 1)
+        if not added:
             return Response(
                 'Вы уже совершили это действие!',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        new_obj = model(user=request.user, recipe=recipe_unit)
-        new_obj.save()
         serializer = SnippetRecipeSerializer(
             recipe_unit,
             context={'request': request}
@@ -108,16 +206,20 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_object(self, request, model, recipe_id):
-        recipe_obj = get_object_or_404(Recipe, id=recipe_id)
-
-        try:
-            obj = model.objects.get(user=request.user, recipe=recipe_obj)
-        except model.DoesNotExist:
+        with transaction.atomic(savepoint=False):
+            removed = RelationWriter.delete(
+                model,
+                'recipe_id',
+                user_id=request.user.id,
+                recipe_id=recipe_id
+            )
+            list_entries_changed(model, request.user.id, removed, -1)
+        if not removed:
+            get_object_or_404(Recipe, id=recipe_id)
             return Response(
                 'Рецепт не найден в списке.',
                 status=status.HTTP_400_BAD_REQUEST
             )
-        obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @sf_action_decorator(ShoppingCart)
@@ -128,6 +230,107 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def favorite(self, request, pk=None):
         pass
 
+    def get_bulk_recipes(self, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        return recipe_ids, Recipe.objects.only(
+            'id',
+            'name',
+            'image',
+            'cooking_time'
+        ).in_bulk(recipe_ids)
+
+    def bulk_response(self, request, recipe_ids, recipes, changed, outcomes):
+        done, skipped = outcomes
+        return Response({
+            'results': [
+                {
+                    'id': recipe_id,
+                    'status': (
+                        done if recipe_id in changed
+                        else skipped if recipe_id in recipes
+                        else 'not_found'
+                    ),
+                }
+                for recipe_id in recipe_ids
+            ],
+            'recipes': SnippetRecipeSerializer(
+                [recipes[pk] for pk in recipe_ids if pk in recipes],
+                many=True,
+                context={'request': request}
+            ).data,
+        })
+
+    def bulk_create_objects(self, request, model):
+        recipe_ids, recipes = self.get_bulk_recipes(request)
+        with transaction.atomic(savepoint=False):
+            added = set(RelationWriter.insert(
+                model,
+                [
+                    {'user_id': request.user.id, 'recipe_id': recipe_id}
+                    for recipe_id in recipes
+                ],
+                'recipe_id'
+            ))
+            list_entries_changed(model, request.user.id, added, 1)
+        return self.bulk_response(
+            request,
+            recipe_ids,
+            recipes,
+            added,
+            ('added', 'exists')
+        )
+
+    def bulk_delete_objects(self, request, model):
+        recipe_ids, recipes = self.get_bulk_recipes(request)
+        with transaction.atomic(savepoint=False):
+            removed = set(RelationWriter.delete(
+                model,
+                'recipe_id',
+                user_id=request.user.id,
+                recipe_id=list(recipes)
+            ))
+            list_entries_changed(model, request.user.id, removed, -1)
+        return self.bulk_response(
+            request,
+            recipe_ids,
+            recipes,
+            removed,
+            ('removed', 'missing')
+        )
+
+    @sf_bulk_action_decorator(ShoppingCart)
+    def bulk_shopping_cart(self, request):
+        pass
+
+    @sf_bulk_action_decorator(Favorite)
+    def bulk_favorite(self, request):
+        pass
+
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """Рецепты авторов из подписок, новые сверху"""
+        page = self.paginate_queryset(
+            FeedEntry.objects.filter(user=request.user).order_by(
+                '-pub_data',
+                '-recipe_id'
+            ).only('recipe', 'pub_data')
+        )
+        recipes = self.get_queryset().in_bulk(
+            [entry.recipe_id for entry in page]
+        )
+        serializer = self.get_serializer(
+            [recipes[entry.recipe_id] for entry in page
+             if entry.recipe_id in recipes],
+            many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
     @action(
         detail=False,
         methods=['GET'],
@@ -135,21 +338,19 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def generate_shopping_cart_file(self, request):
-        uniq_ingredients = RelatedObjectManager.get_uniq_ingredients(
-            request.user
-        )
-        shopcart_file_content = ''
-        if uniq_ingredients:
-            shopcart_file_content = '\n'.join(
-                [(
-                    f'{i["ingredient__name"]}'
-                    f'- {i["total_amount"]}'
-                    f'- {i["ingredient__measurement_unit"]}'
-                ) for i in uniq_ingredients]
+        file_format = request.query_params.get('file_format', 'txt')
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                f'Доступные форматы: {", ".join(EXPORT_FORMATS)}',
+                status=status.HTTP_400_BAD_REQUEST
             )
-            with open('shopping_cart.txt', 'w') as file:
-                file.write(shopcart_file_content)
-        return RelatedObjectManager.create_download_response(
-            shopcart_file_content,
-            'shopping-list.txt'
+        return ShoppingListExport(request.user, file_format).response(
+            'shopping-list'
         )
+
+
+class MetricsView(APIView):
+    permission_classes = (IsMetricsScraper,)
+
+    def get(self, request):
+        return HttpResponse(REGISTRY.exposition(), content_type=CONTENT_TYPE)
@@ -0,0 +1,217 @@
+"""Синтетический набор данных для замеров и проверки планов запросов"""
+import csv
+import random
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q
+
+from api.managers import CounterManager, FeedManager, ShoppingListAggregator
+from recipes.constant import User
+from recipes.models import (Favorite, FeedEntry, Ingredient,
+                            IngredientsRecipe, Recipe, RecipeTag, ShoppingCart,
+                            Tag)
+from users.models import Subscrime
+
+INGREDIENTS_FILE = Path(settings.BASE_DIR) / 'data/ingredients.csv'
+BATCH_SIZE = 5000
+TAGS_COUNT = 10
+RECIPES_PER_USER = 20
+INGREDIENTS_PER_RECIPE = 5
+TAGS_PER_RECIPE = 2
+FAVORITES_PER_RECIPE = 1
+VIEWER_CART_SIZE = 50
+VIEWER_SUBSCRIPTIONS = 100
+# В SQLite любой SCAN - просмотр таблицы или индекса без границ: для
+# запроса с условием индекс тогда не сужает выборку
+SEQ_SCAN_PATTERNS = {
+    'postgresql': r'Seq Scan on "?{table}"?\b',
+    'sqlite': r'\bSCAN "?{table}"?\b',
+}
+# Запросы без условий, для которых проход индекса по порядку до LIMIT
+# и есть лучший план: недопустим только просмотр самой таблицы
+ORDERED_SCANS = {'recipe_feed'}
+ORDERED_SCAN_PATTERNS = {
+    'sqlite': r'\bSCAN "?{table}"?(?! USING)',
+}
+
+
+class DatasetSeeder:
+    """Детерминированное наполнение базы данными для замеров"""
+
+    def __init__(self, seed=42, ingredients_file=INGREDIENTS_FILE):
+        self.random = random.Random(seed)
+        self.ingredients_file = ingredients_file
+        self.recipes_count = 0
+        self.users_count = 0
+        self.viewer = None
+
+    def bulk(self, model, objects):
+        """bulk_create, возвращающий сохраненные объекты с id на любой СУБД"""
+        last_id = model.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+        model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+        return list(model.objects.filter(id__gt=last_id).order_by('id'))
+
+    def prepare(self):
+        with open(self.ingredients_file, encoding='UTF-8') as file:
+            self.bulk(Ingredient, [
+                Ingredient(name=name, measurement_unit=measurement_unit)
+                for name, measurement_unit in csv.reader(file)
+            ])
+        self.bulk(Tag, [
+            Tag(name=f'Тег {i}', color=f'#{i:06X}', slug=f'tag-{i}')
+            for i in range(TAGS_COUNT)
+        ])
+        self.viewer = User.objects.create(
+            username='bench_viewer',
+            email='bench_viewer@example.com',
+            first_name='Bench',
+            last_name='Viewer',
+        )
+        self.ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.tag_ids = list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        start, stop = self.users_count, self.users_count + count
+        self.users_count = stop
+        return self.bulk(User, [
+            User(
+                username=f'bench_{i}',
+                email=f'bench_{i}@example.com',
+                first_name='Bench',
+                last_name=str(i),
+                password='!',
+            )
+            for i in range(start, stop)
+        ])
+
+    @transaction.atomic
+    def grow(self, size):
+        """Догружает рецепты и связи до заданного размера"""
+        new_count = size - self.recipes_count
+        if new_count <= 0:
+            return
+        authors = self.create_users(-(-new_count // RECIPES_PER_USER))
+        recipes = self.bulk(Recipe, [
+            Recipe(
+                author=authors[i % len(authors)],
+                name=f'Рецепт {self.recipes_count + i}',
+                image='recipes/images/bench.jpg',
+                text='Описание рецепта для замеров',
+                cooking_time=self.random.randint(1, 240),
+            )
+            for i in range(new_count)
+        ])
+        self.bulk(RecipeTag, [
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for recipe in recipes
+            for tag_id in self.random.sample(self.tag_ids, TAGS_PER_RECIPE)
+        ])
+        self.bulk(IngredientsRecipe, [
+            IngredientsRecipe(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe in recipes
+            for ingredient_id in self.random.sample(
+                self.ingredient_ids,
+                INGREDIENTS_PER_RECIPE
+            )
+        ])
+        self.bulk(Favorite, [
+            Favorite(user=authors[self.random.randrange(len(authors))],
+                     recipe=recipe)
+            for recipe in recipes
+            for _ in range(FAVORITES_PER_RECIPE)
+        ])
+        self.bulk(ShoppingCart, [
+            ShoppingCart(user=self.viewer, recipe=recipe)
+            for recipe in recipes[:max(
+                0,
+                VIEWER_CART_SIZE - self.recipes_count
+            )]
+        ])
+        followed = self.random.sample(
+            authors,
+            min(len(authors), VIEWER_SUBSCRIPTIONS)
+        )
+        self.bulk(Subscrime, [
+            Subscrime(user=self.viewer, author=author) for author in followed
+        ])
+        FeedManager.backfill(
+            self.viewer.id,
+            [author.id for author in followed]
+        )
+        ShoppingListAggregator.rebuild([self.viewer.id])
+        CounterManager.reconcile()
+        self.recipes_count = size
+
+
+def hot_querysets(seeder):
+    """Горячие запросы и таблицы, полный просмотр которых недопустим"""
+    recipe = Recipe.objects.order_by('-pub_data', '-id').first()
+    viewer = seeder.viewer
+    return {
+        'favorite_lookup': (
+            Favorite.objects.filter(user=viewer, recipe=recipe),
+            (Favorite,),
+        ),
+        'cart_lookup': (
+            ShoppingCart.objects.filter(user=viewer, recipe=recipe),
+            (ShoppingCart,),
+        ),
+        'subscription_lookup': (
+            Subscrime.objects.filter(user=viewer, author_id=recipe.author_id),
+            (Subscrime,),
+        ),
+        'recipe_feed': (
+            Recipe.objects.order_by('-pub_data', '-id')[:6],
+            (Recipe,),
+        ),
+        'recipe_feed_keyset': (
+            Recipe.objects.filter(
+                Q(pub_data__lt=recipe.pub_data)
+                | Q(pub_data=recipe.pub_data, id__lt=recipe.id),
+                pub_data__lte=recipe.pub_data,
+            ).order_by('-pub_data', '-id')[:6],
+            (Recipe,),
+        ),
+        'recipes_by_tag': (
+            Recipe.objects.filter(tags=seeder.tag_ids[0]).order_by(
+                '-pub_data',
+                '-id'
+            )[:6],
+            (Recipe, RecipeTag),
+        ),
+        'subscription_feed': (
+            FeedEntry.objects.filter(user=viewer).order_by(
+                '-pub_data',
+                '-recipe_id'
+            )[:6],
+            (FeedEntry,),
+        ),
+        'author_recipes': (
+            Recipe.objects.filter(author_id=recipe.author_id).order_by(
+                '-pub_data',
+                '-id'
+            )[:3],
+            (Recipe,),
+        ),
+    }
+
+
+def has_seq_scan(plan, model, ordered=False):
+    pattern = SEQ_SCAN_PATTERNS.get(connection.vendor)
+    if ordered:
+        pattern = ORDERED_SCAN_PATTERNS.get(connection.vendor, pattern)
+    if pattern is None:
+        return False
+    return re.search(
+        pattern.format(table=re.escape(model._meta.db_table)),
+        plan
+    ) is not None
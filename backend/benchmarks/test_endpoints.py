@@ -0,0 +1,125 @@
+"""Замер p50/p95, числа запросов и пиковой памяти основных эндпоинтов.
+
+Наборы данных задаются переменной окружения BENCHMARK_SIZES (число
+рецептов через пробел), без нее замеры пропускаются:
+
+    BENCHMARK_SIZES="10000 100000" python -m pytest benchmarks
+"""
+import json
+import os
+import statistics
+import time
+import tracemalloc
+from itertools import product
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.exports import bump_cart_version
+
+from .dataset import DatasetSeeder
+
+SIZES = sorted(int(size) for size in os.getenv('BENCHMARK_SIZES', '').split())
+REPEAT = int(os.getenv('BENCHMARK_REPEAT', 20))
+SEED = int(os.getenv('BENCHMARK_SEED', 42))
+OUTPUT = os.getenv('BENCHMARK_OUTPUT', 'benchmark-results.json')
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/'
+# Имя замера: адрес и нужно ли сбрасывать кеш выгрузки перед запросом.
+# Выгрузка после первого запроса отдается из кеша без SQL-запросов,
+# поэтому холодная и теплая выгрузки замеряются отдельно
+ENDPOINTS = {
+    'recipes': ('/api/recipes/?limit=6', False),
+    'subscriptions': (
+        '/api/users/subscriptions/?limit=6&recipes_limit=3', False
+    ),
+    'feed': ('/api/recipes/feed/?limit=6', False),
+    'ingredients_search': ('/api/ingredients/?name=са', False),
+    'download_shopping_cart_cold': (DOWNLOAD_URL, True),
+    'download_shopping_cart_warm': (DOWNLOAD_URL, False),
+}
+
+pytestmark = pytest.mark.skipif(
+    not SIZES,
+    reason='Размеры наборов данных не заданы в BENCHMARK_SIZES'
+)
+
+
+@pytest.fixture(scope='module')
+def seeder(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        seeder = DatasetSeeder(SEED)
+        seeder.prepare()
+        yield seeder
+        call_command('flush', interactive=False, verbosity=0)
+
+
+@pytest.fixture(scope='module')
+def results():
+    results = []
+    yield results
+    with open(OUTPUT, 'w', encoding='UTF-8') as file:
+        json.dump(
+            {
+                'vendor': connection.vendor,
+                'repeat': REPEAT,
+                'seed': SEED,
+                'results': results,
+            },
+            file,
+            ensure_ascii=False,
+            indent=2,
+        )
+
+
+def fetch(client, url):
+    response = client.get(url)
+    assert response.status_code == 200
+    if response.streaming:
+        return b''.join(response.streaming_content)
+    return response.content
+
+
+def measure(client, url, prepare):
+    fetch(client, url)
+    timings = []
+    for _ in range(REPEAT):
+        prepare()
+        started = time.perf_counter()
+        fetch(client, url)
+        timings.append((time.perf_counter() - started) * 1000)
+    prepare()
+    with CaptureQueriesContext(connection) as queries:
+        tracemalloc.start()
+        fetch(client, url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    timings.sort()
+    return {
+        'p50_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'queries': len(queries),
+        'peak_memory_kb': peak / 1024,
+    }
+
+
+@pytest.mark.parametrize('size,endpoint', list(product(SIZES, ENDPOINTS)))
+def test_endpoint(seeder, results, django_db_blocker, size, endpoint):
+    url, cold = ENDPOINTS[endpoint]
+    viewer = seeder.viewer
+
+    def prepare():
+        if cold:
+            bump_cart_version(viewer.id)
+
+    with django_db_blocker.unblock():
+        seeder.grow(size)
+        client = APIClient()
+        client.force_authenticate(viewer)
+        results.append({
+            'size': size,
+            'endpoint': endpoint,
+            **measure(client, url, prepare),
+        })
@@ -0,0 +1,52 @@
+import asyncio
+
+from asgiref.sync import markcoroutinefunction
+
+
+class SyncAndAsyncMiddleware:
+    """Основа middleware, которая работает под WSGI и под ASGI.
+
+    Синхронную middleware Django под ASGI оборачивает в
+    sync_to_async(thread_sensitive=True), и все запросы проходят через
+    один поток по очереди. Здесь цепочка вызывается так, как ее отдал
+    Django: под ASGI ответ ожидается в том же событийном цикле.
+
+    Подкласс описывает три шага: enter(request) перед обработкой
+    запроса, exit(state) после нее (в том числе при исключении) и
+    process_response(request, response, state) над готовым ответом.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = asyncio.iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def enter(self, request):
+        return None
+
+    def exit(self, state):
+        pass
+
+    def process_response(self, request, response, state):
+        return response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        state = self.enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.exit(state)
+        return self.process_response(request, response, state)
+
+    async def __acall__(self, request):
+        state = self.enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.exit(state)
+        return self.process_response(request, response, state)
@@ -0,0 +1,74 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+
+from .middleware import SyncAndAsyncMiddleware
+
+REPLICA = 'replica'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'read_primary'
+PIN_HEADER = 'HTTP_X_READ_PRIMARY'
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_enabled():
+    return REPLICA in settings.DATABASES
+
+
+class ReplicaRouter:
+    """Безопасные запросы к API читают с реплики, остальное - с основной.
+
+    Решение принимает ReplicaMiddleware; вне запросов (воркеры, команды,
+    админка) все запросы идут в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        if replica_enabled() and read_from_replica.get():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaMiddleware(SyncAndAsyncMiddleware):
+    """Выбирает базу для чтения и закрепляет клиента за основной после записи.
+
+    После небезопасного запроса клиент получает короткоживущую cookie,
+    и пока она жива, его чтения идут в основную базу: так он видит свои
+    изменения, даже если реплика отстает. Клиенты без cookie могут
+    передать заголовок X-Read-Primary.
+    """
+
+    def use_replica(self, request):
+        return (
+            replica_enabled()
+            and request.method in SAFE_METHODS
+            and request.path.startswith('/api/')
+            and PIN_COOKIE not in request.COOKIES
+            and PIN_HEADER not in request.META
+        )
+
+    def enter(self, request):
+        return read_from_replica.set(self.use_replica(request))
+
+    def exit(self, token):
+        read_from_replica.reset(token)
+
+    def process_response(self, request, response, token):
+        if request.method not in SAFE_METHODS and replica_enabled():
+            response.set_cookie(
+                PIN_COOKIE,
+                '1',
+                max_age=settings.REPLICA_PIN_SECONDS,
+                httponly=True,
+                samesite='Lax',
+            )
+        return response
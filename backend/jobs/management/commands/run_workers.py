@@ -0,0 +1,107 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobs.queue import VISIBILITY_TIMEOUT, claim, run
+
+
+class Worker:
+    """Цикл одного процесса: забрать пачку задач, выполнить, повторить"""
+
+    def __init__(self, batch_size, poll_interval, visibility_timeout):
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.stopped = False
+
+    def stop(self, *args):
+        self.stopped = True
+
+    def run_once(self):
+        close_old_connections()
+        jobs = claim(self.batch_size, self.visibility_timeout)
+        for job in jobs:
+            run(job)
+        return len(jobs)
+
+    def __call__(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        while not self.stopped:
+            if not self.run_once():
+                time.sleep(self.poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Запуск пула процессов, выполняющих фоновые задачи из базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=2,
+            help='Число процессов-воркеров'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10,
+            help='Сколько задач воркер забирает за раз'
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--visibility-timeout',
+            type=int,
+            default=VISIBILITY_TIMEOUT,
+            help='Через сколько секунд незавершенную задачу заберут снова'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить готовые задачи в текущем процессе и выйти'
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            options['batch_size'],
+            options['poll_interval'],
+            options['visibility_timeout'],
+        )
+        if options['once']:
+            done = 0
+            while True:
+                count = worker.run_once()
+                if not count:
+                    break
+                done += count
+            self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {done}'))
+            return
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        processes = [None] * options['processes']
+        self.stdout.write(self.style.SUCCESS(
+            f'Запуск воркеров: {len(processes)}'
+        ))
+        while not worker.stopped:
+            for number, process in enumerate(processes):
+                if process is None or not process.is_alive():
+                    connections.close_all()
+                    processes[number] = multiprocessing.Process(
+                        target=worker,
+                        daemon=True
+                    )
+                    processes[number].start()
+            time.sleep(options['poll_interval'])
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        self.stdout.write('Воркеры остановлены')
@@ -0,0 +1,70 @@
+from django.db import models
+from django.utils import timezone
+
+from recipes.constant import MAX_LEN
+
+
+class Job(models.Model):
+    """Фоновая задача в очереди на базе данных"""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'Ожидает'),
+        (RUNNING, 'Выполняется'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        'Задача',
+        max_length=MAX_LEN,
+    )
+    payload = models.JSONField(
+        'Аргументы',
+        default=dict,
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=20,
+        choices=STATUSES,
+        default=PENDING,
+    )
+    attempts = models.PositiveIntegerField(
+        'Попыток',
+        default=0,
+    )
+    max_attempts = models.PositiveIntegerField(
+        'Максимум попыток',
+        default=5,
+    )
+    run_at = models.DateTimeField(
+        'Запустить не раньше',
+        default=timezone.now,
+    )
+    locked_until = models.DateTimeField(
+        'Занята до',
+        null=True,
+        blank=True,
+    )
+    last_error = models.TextField(
+        'Последняя ошибка',
+        blank=True,
+    )
+    created_at = models.DateTimeField(
+        'Создана',
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('run_at', )
+        indexes = [
+            models.Index(
+                fields=('status', 'run_at'),
+                name='job_status_run_at',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
@@ -0,0 +1,108 @@
+import logging
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+VISIBILITY_TIMEOUT = 300
+RETRY_DELAY = 10
+MAX_RETRY_DELAY = 60 * 60
+
+
+def task(name):
+    """Регистрирует функцию как фоновую задачу с именем name"""
+    def decorator(func):
+        TASKS[name] = func
+        return func
+    return decorator
+
+
+def enqueue(name, **payload):
+    enqueue_many(name, [payload])
+
+
+def enqueue_many(name, payloads):
+    """Ставит задачи в очередь в текущей транзакции.
+
+    Воркер увидит их только после коммита основных изменений.
+    С JOBS_EAGER=True задачи выполняются сразу после коммита.
+    """
+    if not payloads:
+        return
+    if name not in TASKS:
+        raise KeyError(f'Неизвестная задача: {name}')
+    if getattr(settings, 'JOBS_EAGER', False):
+        for payload in payloads:
+            transaction.on_commit(
+                lambda payload=payload: TASKS[name](**payload)
+            )
+        return
+    Job.objects.bulk_create(
+        [Job(name=name, payload=payload) for payload in payloads]
+    )
+
+
+def retry_delay(attempts):
+    return timedelta(
+        seconds=min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+    )
+
+
+@transaction.atomic
+def claim(batch_size, visibility_timeout=VISIBILITY_TIMEOUT):
+    """Забирает готовые задачи, включая брошенные упавшими воркерами.
+
+    Занятая задача невидима для других воркеров visibility_timeout
+    секунд; если за это время она не завершена, ее заберут снова.
+    """
+    now = timezone.now()
+    jobs = list(
+        Job.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Job.PENDING, run_at__lte=now)
+            | Q(status=Job.RUNNING, locked_until__lt=now)
+        ).order_by('run_at')[:batch_size]
+    )
+    exhausted = [job.id for job in jobs if job.attempts >= job.max_attempts]
+    Job.objects.filter(id__in=exhausted).update(
+        status=Job.FAILED,
+        locked_until=None,
+        last_error='Превышено время выполнения'
+    )
+    claimed = [job for job in jobs if job.id not in exhausted]
+    locked_until = now + timedelta(seconds=visibility_timeout)
+    for job in claimed:
+        job.status = Job.RUNNING
+        job.attempts += 1
+        job.locked_until = locked_until
+    Job.objects.bulk_update(claimed, ('status', 'attempts', 'locked_until'))
+    return claimed
+
+
+def run(job):
+    """Выполняет задачу; возвращает True при успехе"""
+    own = Job.objects.filter(id=job.id, locked_until=job.locked_until)
+    try:
+        TASKS[job.name](**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s #%s упала', job.name, job.id)
+        if job.attempts >= job.max_attempts:
+            own.update(status=Job.FAILED, locked_until=None, last_error=error)
+        else:
+            own.update(
+                status=Job.PENDING,
+                locked_until=None,
+                run_at=timezone.now() + retry_delay(job.attempts),
+                last_error=error
+            )
+        return False
+    own.delete()
+    return True
@@ -2,6 +2,9 @@ from django.core.exceptions import ValidationError
 from django.forms.models import BaseInlineFormSet
 from django.contrib import admin
 
+from api.exports import bump_recipe_carts
+from api.managers import ShoppingListAggregator
+
 from .models import (Favorite, Ingredient, IngredientsRecipe, Recipe,
                      RecipeTag, ShoppingCart, Tag)
 
@@ -69,9 +72,20 @@ class RecipeAdmin(BaseFieldsAdmin):
     search_fields = ('name',)
     inlines = (IngredientRecipeInLine, TagRecipeInLine)
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        if change:
+            ShoppingListAggregator.rebuild(list(
+                ShoppingCart.objects.filter(
+                    recipe=form.instance
+                ).values_list('user_id', flat=True)
+            ))
+            bump_recipe_carts(form.instance)
+
     def total_count(self, instance):
-        return instance.favorite_set.count()
+        return instance.favorites_count
     total_count.short_description = 'Общее кол-во добавлений в избранное'
+    total_count.admin_order_field = 'favorites_count'
 
 
 admin.site.register(Favorite)
@@ -3,4 +3,5 @@ from django.contrib.auth import get_user_model
 MIN = 1
 MAX = 5000
 MAX_LEN = 200
+BULK_LIMIT = 100
 User = get_user_model()
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+from recipes.storage import ImageDerivatives
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий картинок для уже загруженных рецептов'
+
+    def handle(self, *args, **options):
+        images = Recipe.objects.order_by().values_list(
+            'image',
+            flat=True
+        ).distinct()
+        created = 0
+        for image in images.iterator():
+            try:
+                created += ImageDerivatives(image).build()
+            except (OSError, ValueError) as error:
+                self.stderr.write(self.style.WARNING(f'{image}: {error}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано уменьшенных копий: {created}'
+        ))
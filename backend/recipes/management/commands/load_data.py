@@ -1,43 +1,120 @@
 import csv
+import json
+import time
+from itertools import islice
+from pathlib import Path
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.search import ingredient_index
+from recipes.constant import MAX_LEN
 from recipes.models import Ingredient
 
+BATCH_SIZE = 5000
+
 
 class Command(BaseCommand):
-    help = 'Импорт ингредиентов из CSV файла'
+    help = 'Импорт ингредиентов из CSV или JSON файла'
     file_path = 'data/ingredients.csv'
 
     def add_arguments(self, parser):
         parser.add_argument(
             'file_path',
             type=str,
-            help='Путь к файлу CSV с ингредиентами'
+            nargs='?',
+            default=self.file_path,
+            help='Путь к файлу CSV или JSON с ингредиентами'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help='Количество строк в одном INSERT'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Прочитать файл и посчитать новые строки без сохранения'
+        )
+
+    def read_csv(self, file):
+        yield from csv.reader(file)
+
+    def read_json(self, file):
+        for item in json.load(file):
+            yield item.get('name'), item.get('measurement_unit')
+
+    def read_rows(self, file, file_path):
+        reader = (
+            self.read_json
+            if Path(file_path).suffix.lower() == '.json'
+            else self.read_csv
         )
+        for row in reader(file):
+            if (
+                len(row) != 2
+                or not all(row)
+                or any(len(value) > MAX_LEN for value in row)
+            ):
+                self.skipped += 1
+                continue
+            yield Ingredient(
+                name=row[0].strip(),
+                measurement_unit=row[1].strip()
+            )
 
     def handle(self, *args, **options):
         file_path = options['file_path']
+        self.skipped = 0
         try:
             with open(file_path, encoding='UTF-8') as file:
-                csv_reader = csv.reader(file)
-                for row in csv_reader:
-                    name, measurement_unit = row
-                    Ingredient.objects.create(
-                        name=name,
-                        measurement_unit=measurement_unit
-                    )
-                self.stdout.write(
-                    self.style.SUCCESS('Импорт данных завершен!')
+                self.load(
+                    self.read_rows(file, file_path),
+                    options['batch_size'],
+                    options['dry_run']
                 )
         except FileNotFoundError:
             self.stderr.write(
                 self.style.ERROR('Файл не найден. Проверьте путь к файлу.')
             )
-        except csv.Error:
+        except (csv.Error, json.JSONDecodeError):
             self.stderr.write(
                 self.style.ERROR(
-                    'Ошибка при чтении файла CSV. Проверьте формат файла.'
+                    'Ошибка при чтении файла. Проверьте формат файла.'
                 )
             )
         except Exception as e:
             self.stderr.write(self.style.ERROR(f'Произошла ошибка: {e}'))
+
+    def load(self, rows, batch_size, dry_run):
+        started = time.perf_counter()
+        processed = 0
+        with transaction.atomic():
+            count_before = Ingredient.objects.count()
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                processed += len(batch)
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f'Обработано строк: {processed} '
+                    f'({processed / elapsed:.0f} строк/с)'
+                )
+            created = Ingredient.objects.count() - count_before
+            if dry_run:
+                transaction.set_rollback(True)
+        if not dry_run:
+            ingredient_index.invalidate()
+        elapsed = time.perf_counter() - started
+        title = (
+            'Проверка файла завершена' if dry_run
+            else 'Импорт данных завершен'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{title} за {elapsed:.2f} с: '
+            f'новых {created}, уже было {processed - created}, '
+            f'пропущено некорректных {self.skipped}'
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+
+from api.managers import CounterManager
+from jobs.queue import enqueue
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересчет денормализованных счетчиков'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, не исправляя их'
+        )
+        parser.add_argument(
+            '--enqueue',
+            action='store_true',
+            help='Поставить пересчет в очередь фоновых задач'
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            enqueue('reconcile_counters')
+            self.stdout.write(
+                self.style.SUCCESS('Пересчет поставлен в очередь')
+            )
+            return
+        drift = CounterManager.reconcile(check=options['check'])
+        for counter, stale in drift.items():
+            self.stdout.write(f'{counter}: расхождений {stale}')
+        total = sum(drift.values())
+        if options['check'] and total:
+            self.stdout.write(self.style.WARNING(
+                f'Найдено расхождений: {total}'
+            ))
+        elif options['check']:
+            self.stdout.write(self.style.SUCCESS('Счетчики актуальны'))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Исправлено счетчиков: {total}'
+            ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from api.managers import ShoppingListAggregator
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересборка агрегированных списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, не исправляя их'
+        )
+        parser.add_argument(
+            '--users',
+            nargs='+',
+            type=int,
+            help='id пользователей (по умолчанию все)'
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['users']
+        drifted = ShoppingListAggregator.drifted_users(user_ids)
+        if drifted:
+            self.stdout.write(self.style.WARNING(
+                f'Расхождения у пользователей: '
+                f'{", ".join(map(str, sorted(drifted)))}'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+        if options['check']:
+            return
+        ShoppingListAggregator.rebuild(user_ids)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересобраны'))
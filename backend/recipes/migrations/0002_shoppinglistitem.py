@@ -0,0 +1,69 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_lists(apps, schema_editor):
+    """Сводный список покупок каждого пользователя из его корзины.
+
+    Повторы в корзине удаляются только в 0008, поэтому каждая пара
+    пользователь - рецепт учитывается один раз.
+    """
+    IngredientsRecipe = apps.get_model('recipes', 'IngredientsRecipe')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(
+        f'INSERT INTO {quote(ShoppingListItem._meta.db_table)} '
+        f'(user_id, ingredient_id, total_amount) '
+        f'SELECT c.user_id, i.ingredient_id, SUM(i.amount) '
+        f'FROM (SELECT DISTINCT user_id, recipe_id '
+        f'FROM {quote(ShoppingCart._meta.db_table)}) c '
+        f'INNER JOIN {quote(IngredientsRecipe._meta.db_table)} i '
+        f'ON i.recipe_id = c.recipe_id '
+        f'GROUP BY c.user_id, i.ingredient_id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='ingredientsrecipe',
+            options={'verbose_name': 'ингредиент в рецепт', 'verbose_name_plural': 'Кол-во ингредиентов в рецепте'},
+        ),
+        migrations.AlterModelOptions(
+            name='recipetag',
+            options={'verbose_name': 'Тег', 'verbose_name_plural': 'Теги'},
+        ),
+        migrations.AlterField(
+            model_name='recipetag',
+            name='tag',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.tag', verbose_name='Тег'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Позиция списка покупок',
+                'verbose_name_plural': 'Позиции списка покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistitem',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_item'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:38
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Повторные запуски load_data могли задублировать справочник"""
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientsRecipe = apps.get_model('recipes', 'IngredientsRecipe')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name',
+        'measurement_unit'
+    ).annotate(keep_id=Min('id'), total=Count('id')).filter(total__gt=1)
+    for group in duplicates:
+        extra_ids = list(Ingredient.objects.filter(
+            name=group['name'],
+            measurement_unit=group['measurement_unit'],
+        ).exclude(id=group['keep_id']).values_list('id', flat=True))
+        IngredientsRecipe.objects.filter(
+            ingredient_id__in=extra_ids
+        ).update(ingredient_id=group['keep_id'])
+        for item in ShoppingListItem.objects.filter(
+            ingredient_id__in=extra_ids
+        ):
+            kept, _ = ShoppingListItem.objects.get_or_create(
+                user_id=item.user_id,
+                ingredient_id=group['keep_id'],
+                defaults={'total_amount': 0},
+            )
+            kept.total_amount += item.total_amount
+            kept.save()
+            item.delete()
+        Ingredient.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_shoppinglistitem'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def remove_duplicates(model, fields):
+    """Оставляет первую строку каждой группы повторов, возвращает их число"""
+    duplicates = list(model.objects.values(*fields).annotate(
+        keep_id=Min('id'),
+        total=Count('id')
+    ).filter(total__gt=1))
+    for group in duplicates:
+        model.objects.filter(
+            **{field: group[field] for field in fields}
+        ).exclude(id=group['keep_id']).delete()
+    return len(duplicates)
+
+
+def remove_duplicate_entries(apps, schema_editor):
+    """Повторы появлялись при гонке двойного клика до уникальных индексов.
+
+    Счетчики из 0006 посчитаны вместе с повторами, поэтому после их
+    удаления пересчитываются. Сводный список покупок в 0002 уже учитывал
+    каждую пару пользователь - рецепт один раз.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    for model_name, counter in (
+        ('Favorite', 'favorites_count'),
+        ('ShoppingCart', 'in_carts_count'),
+    ):
+        model = apps.get_model('recipes', model_name)
+        if remove_duplicates(model, ('user', 'recipe')):
+            Recipe.objects.update(**{counter: count_of(model, 'recipe')})
+    remove_duplicates(apps.get_model('recipes', 'RecipeTag'), ('tag', 'recipe'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_image_storage'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_entries,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations
+
+
+def fill_feed(apps, schema_editor):
+    """Лента каждого подписчика из уже опубликованных рецептов авторов"""
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscrime = apps.get_model('users', 'Subscrime')
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(
+        f'INSERT INTO {quote(FeedEntry._meta.db_table)} '
+        f'(user_id, recipe_id, author_id, pub_data) '
+        f'SELECT s.user_id, r.id, r.author_id, r.pub_data '
+        f'FROM {quote(Subscrime._meta.db_table)} s '
+        f'INNER JOIN {quote(Recipe._meta.db_table)} r '
+        f'ON r.author_id = s.author_id'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_feedentry'),
+        ('users', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 
 from .constant import MAX_LEN, User
+from .storage import get_image_storage
 from .validators import BaseUnitValid, Valid_color
 
 
@@ -26,6 +27,10 @@ class Tag(models.Model):
         blank=False,
         unique=True,
     )
+    updated_at = models.DateTimeField(
+        'Время изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -48,10 +53,27 @@ class Ingredient(models.Model):
         max_length=MAX_LEN,
         blank=False,
     )
+    updated_at = models.DateTimeField(
+        'Время изменения',
+        auto_now=True,
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('name',),
+                name='ingredient_name_prefix',
+                opclasses=('varchar_pattern_ops',),
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} - {self.measurement_unit}'
@@ -80,6 +102,7 @@ class Recipe(models.Model):
     image = models.ImageField(
         'Картинка рецепта',
         upload_to='recipes/images/',
+        storage=get_image_storage,
         blank=False
     )
     text = models.TextField(
@@ -101,15 +124,47 @@ class Recipe(models.Model):
         auto_now_add=True,
         blank=False
     )
+    updated_at = models.DateTimeField(
+        'Время изменения',
+        auto_now=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлений в избранное',
+        default=0,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'Добавлений в списки покупок',
+        default=0,
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_data', ]
+        indexes = [
+            models.Index(
+                fields=('-pub_data', '-id'),
+                name='recipe_pub_data_id',
+            ),
+            models.Index(
+                fields=('author', '-pub_data', '-id'),
+                name='recipe_author_pub_data_id',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        recipe = super().from_db(db, field_names, values)
+        recipe.stored_image = recipe.__dict__.get('image')
+        return recipe
+
+    def image_changed(self):
+        """Картинка у нового рецепта или отличается от сохраненной"""
+        return self.image.name != getattr(self, 'stored_image', None)
+
 
 class ListEntryModel(models.Model):
     """Абстрактная модель"""
@@ -124,6 +179,12 @@ class ListEntryModel(models.Model):
 
     class Meta:
         abstract = True
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_%(class)s_user_recipe',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} - {self.recipe}'
@@ -131,7 +192,7 @@ class ListEntryModel(models.Model):
 
 class Favorite(ListEntryModel):
     """Модель для Избранное"""
-    class Meta:
+    class Meta(ListEntryModel.Meta):
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
 
@@ -142,7 +203,7 @@ class Favorite(ListEntryModel):
 class ShoppingCart(ListEntryModel):
     """Модель для списка покупок"""
 
-    class Meta:
+    class Meta(ListEntryModel.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Список покупок'
 
@@ -167,6 +228,12 @@ class RecipeTag(models.Model):
     class Meta:
         verbose_name = 'Тег'
         verbose_name_plural = 'Теги'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('tag', 'recipe'),
+                name='unique_recipe_tag',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.tag} - {self.recipe}'
@@ -195,3 +262,74 @@ class IngredientsRecipe(models.Model):
 
     def __str__(self):
         return f'{self.ingredient} - {self.recipe}'
+
+
+class ShoppingListItem(models.Model):
+    """Суммарное количество ингредиента в списке покупок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_list',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    total_amount = models.PositiveIntegerField('Общее количество')
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Позиции списка покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient}: {self.total_amount}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт автора в ленте подписчика, хранится для чтения без JOIN"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_data = models.DateTimeField('Время публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=('user', '-pub_data', '-recipe'),
+                name='feed_user_pub_data_recipe',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
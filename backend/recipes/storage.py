@@ -0,0 +1,139 @@
+import hashlib
+import io
+import posixpath
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from PIL import Image, ImageOps
+
+DERIVATIVES_DIR = 'recipes/derivatives'
+DERIVATIVES_KEY = 'image-derivatives:{key}'
+DERIVATIVES_TIMEOUT = 60 * 60 * 24
+DERIVATIVE_SIZES = {
+    'card': (480, 360),
+    'detail': (1200, 900),
+}
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, где имя файла - хеш содержимого.
+
+    Одинаковые загрузки указывают на один и тот же файл.
+    """
+
+    @staticmethod
+    def content_hash(content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def save(self, name, content, max_length=None):
+        if not hasattr(content, 'chunks'):
+            content = ContentFile(content.read())
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        name = posixpath.join(
+            directory,
+            f'{self.content_hash(content)}{extension}'
+        )
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+
+def get_image_storage():
+    return ContentAddressedStorage()
+
+
+class ImageDerivatives:
+    """Уменьшенные копии картинки рецепта в WebP и JPEG"""
+
+    def __init__(self, image_name, storage=default_storage):
+        self.image_name = image_name
+        self.storage = storage
+        self.key = posixpath.splitext(posixpath.basename(image_name))[0]
+
+    def name(self, size, file_format):
+        return f'{DERIVATIVES_DIR}/{self.key}/{size}.{file_format}'
+
+    def names(self):
+        return {
+            size: {
+                file_format: self.name(size, file_format)
+                for file_format in DERIVATIVE_FORMATS
+            }
+            for size in DERIVATIVE_SIZES
+        }
+
+    def missing(self):
+        return [
+            (size, file_format)
+            for size, formats in self.names().items()
+            for file_format, name in formats.items()
+            if not self.storage.exists(name)
+        ]
+
+    def render(self, original, size, file_format):
+        image = original.copy()
+        image.thumbnail(DERIVATIVE_SIZES[size], Image.LANCZOS)
+        pil_format, options = DERIVATIVE_FORMATS[file_format]
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **options)
+        return ContentFile(buffer.getvalue())
+
+    def build(self):
+        """Создает недостающие копии, возвращает их число"""
+        if not self.image_name:
+            return 0
+        missing = self.missing()
+        if not missing:
+            return 0
+        with self.storage.open(self.image_name) as file:
+            original = ImageOps.exif_transpose(Image.open(file))
+            original = original.convert('RGB')
+        for size, file_format in missing:
+            self.storage.save(
+                self.name(size, file_format),
+                self.render(original, size, file_format)
+            )
+        return len(missing)
+
+    def existing(self):
+        """Уже созданные копии {размер: {формат: имя}}.
+
+        Имя файла зависит от содержимого оригинала, поэтому готовый
+        полный набор не меняется и кешируется; пока воркер не создал
+        все копии, наличие файлов проверяется заново.
+        """
+        key = DERIVATIVES_KEY.format(key=self.key)
+        names = cache.get(key)
+        if names is not None:
+            return names
+        names = {}
+        complete = True
+        for size, formats in self.names().items():
+            for file_format, name in formats.items():
+                if self.storage.exists(name):
+                    names.setdefault(size, {})[file_format] = name
+                else:
+                    complete = False
+        if complete:
+            cache.set(key, names, DERIVATIVES_TIMEOUT)
+        return names
+
+    def urls(self):
+        return {
+            size: {
+                file_format: self.storage.url(name)
+                for file_format, name in formats.items()
+            }
+            for size, formats in self.existing().items()
+        }
@@ -0,0 +1,80 @@
+import io
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from benchmarks.dataset import (ORDERED_SCANS, DatasetSeeder, has_seq_scan,
+                                hot_querysets)
+
+from .models import Recipe
+from .storage import ImageDerivatives
+
+RECIPES = 200
+
+
+class QueryPlanTestCase(TestCase):
+    """Горячие запросы не читают большие таблицы целиком"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeder = DatasetSeeder()
+        cls.seeder.prepare()
+        cls.seeder.grow(RECIPES)
+
+    def setUp(self):
+        if connection.vendor == 'postgresql':
+            # На маленьких таблицах PostgreSQL и так предпочтет Seq Scan,
+            # а при запрете он выберет его, только если индекса нет
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+
+    def test_hot_queries_use_indexes(self):
+        for name, (queryset, models) in hot_querysets(self.seeder).items():
+            plan = queryset.explain()
+            for model in models:
+                with self.subTest(query=name, table=model._meta.db_table):
+                    self.assertFalse(
+                        has_seq_scan(plan, model, name in ORDERED_SCANS),
+                        plan
+                    )
+
+    def test_unbounded_scan_is_reported(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('План с обходом индекса по порядку есть в SQLite')
+        plan = Recipe.objects.filter(text='x').explain()
+        self.assertTrue(has_seq_scan(plan, Recipe), plan)
+
+
+class ImageDerivativesTestCase(TestCase):
+    """Ссылки только на уже созданные уменьшенные копии"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1200), 'red').save(buffer, 'PNG')
+        self.name = default_storage.save(
+            'recipes/images/test.png',
+            ContentFile(buffer.getvalue())
+        )
+
+    def test_urls_follow_built_files(self):
+        derivatives = ImageDerivatives(self.name)
+        self.assertEqual(derivatives.urls(), {})
+        self.assertEqual(derivatives.build(), 4)
+        default_storage.delete(derivatives.name('detail', 'webp'))
+        urls = derivatives.urls()
+        self.assertEqual(set(urls['card']), {'webp', 'jpeg'})
+        self.assertEqual(set(urls['detail']), {'jpeg'})
+        self.assertEqual(derivatives.build(), 1)
+        self.assertEqual(set(derivatives.urls()['detail']), {'webp', 'jpeg'})
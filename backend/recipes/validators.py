@@ -2,7 +2,6 @@ from django.apps import apps
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
 from django.db import models
-from django.shortcuts import get_object_or_404
 
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
@@ -19,21 +18,20 @@ Valid_color = RegexValidator(
 class UniqValidate:
     @staticmethod
     def validate_unique_objects(value, fields_name, model_name):
+        """Существование объектов уже проверено полями сериализатора"""
         objects = value.get(fields_name)
         if not objects:
             raise serializers.ValidationError(
                 f'Не оставляйте поле {fields_name} пустым, добавьте элементы'
             )
-        uniq_objects = set()
+        uniq_ids = set()
         for obj in objects:
-            Model = apps.get_model('recipes', model_name)
             obj_id = obj.get('id') if model_name != 'Tag' else obj.id
-            instance = get_object_or_404(Model, id=obj_id)
-            if instance in uniq_objects:
+            if obj_id in uniq_ids:
                 raise serializers.ValidationError(
                     'Добавлять одинаковые элементы запрещено'
                 )
-            uniq_objects.add(instance)
+            uniq_ids.add(obj_id)
         return value
 
 
@@ -74,14 +72,22 @@ class DataValidationHelpers:
         return False
 
     @staticmethod
-    def validate_id(value):
+    def validate_ids(items):
+        """Проверка всех ингредиентов рецепта одним запросом"""
         Ingredient = apps.get_model('recipes', 'Ingredient')
-        if not Ingredient.objects.filter(id=value).exists():
+        found = set(Ingredient.objects.filter(
+            id__in={item['id'] for item in items}
+        ).values_list('id', flat=True))
+        if any(item['id'] not in found for item in items):
             raise serializers.ValidationError(
-                'Ингредиент с таким ID не существует!',
+                [
+                    {} if item['id'] in found
+                    else {'id': ['Ингредиент с таким ID не существует!']}
+                    for item in items
+                ],
                 code=status.HTTP_400_BAD_REQUEST
             )
-        return value
+        return items
 
     @staticmethod
     def create_relationships(self, items, model, recipe, **kwargs):
@@ -0,0 +1,46 @@
+from django.db import migrations
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('pk')).values('total')
+    ), 0)
+
+
+def remove_duplicate_subscriptions(apps, schema_editor):
+    """Оставляет первую подписку каждой пары перед уникальным индексом.
+
+    followers_count из 0002 посчитан вместе с повторами и пересчитывается.
+    """
+    Subscrime = apps.get_model('users', 'Subscrime')
+    duplicates = list(Subscrime.objects.values('user', 'author').annotate(
+        keep_id=Min('id'),
+        total=Count('id')
+    ).filter(total__gt=1))
+    for group in duplicates:
+        Subscrime.objects.filter(
+            user=group['user'],
+            author=group['author']
+        ).exclude(id=group['keep_id']).delete()
+    if duplicates:
+        apps.get_model('users', 'CustomUser').objects.update(
+            followers_count=count_of(Subscrime, 'author')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_user_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_subscriptions,
+            migrations.RunPython.noop,
+        ),
+    ]
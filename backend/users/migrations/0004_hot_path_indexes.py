@@ -0,0 +1,17 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_remove_duplicate_subscriptions'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='subscrime',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_subscription'),
+        ),
+    ]
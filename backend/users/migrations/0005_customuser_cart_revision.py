@@ -0,0 +1,18 @@
+# Generated by Django 3.2.3 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='cart_revision',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия списка покупок'),
+        ),
+    ]
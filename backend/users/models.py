@@ -35,6 +35,18 @@ class CustomUser(AbstractUser):
         max_length=MAX_LEN,
         blank=False,
     )
+    recipes_count = models.PositiveIntegerField(
+        'Количество рецептов',
+        default=0,
+    )
+    followers_count = models.PositiveIntegerField(
+        'Количество подписчиков',
+        default=0,
+    )
+    cart_revision = models.PositiveIntegerField(
+        'Версия списка покупок',
+        default=0,
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -62,6 +74,12 @@ class Subscrime(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_subscription',
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.user} подписан на {self.author}'
@@ -4,10 +4,12 @@ import base64
 # Импорты сторонних библиотек
 from django.core.files.base import ContentFile
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
 # Локальные импорты
 from api.decorators import customrecipefields_decorator, get_field_decorator
 from recipes.models import Favorite, ShoppingCart
+from recipes.storage import ImageDerivatives
 
 
 class ExtendedImageField(serializers.ImageField):
@@ -47,6 +49,70 @@ class ExtendedImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class ImageDerivativesField(serializers.Field):
+    """Ссылки на уменьшенные копии картинки: {размер: {формат: url}}.
+
+    В ответ попадают только уже созданные копии; пока их нет, поле
+    равно null и клиент показывает оригинал из поля image.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        urls = ImageDerivatives(value.name).urls()
+        if not urls:
+            return None
+        if request is None:
+            return urls
+        return {
+            size: {
+                file_format: request.build_absolute_uri(url)
+                for file_format, url in formats.items()
+            }
+            for size, formats in urls.items()
+        }
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, загружаемый одним запросом"""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        child = self.child_relation
+        pks = []
+        for pk in data:
+            if isinstance(pk, bool):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                pks.append(int(pk))
+            except (TypeError, ValueError):
+                child.fail('incorrect_type', data_type=type(pk).__name__)
+        objects = child.get_queryset().in_bulk(pks)
+        for pk in pks:
+            if pk not in objects:
+                child.fail('does_not_exist', pk_value=pk)
+        return [objects[pk] for pk in pks]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
 class RecipeIngredientsExtendedSerializer(serializers.ModelSerializer):
     id = serializers.SerializerMethodField()
     name = serializers.SerializerMethodField()
@@ -61,11 +127,11 @@ class CustomRecipeFieldsSerializer(serializers.Serializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
-    @customrecipefields_decorator(Favorite)
+    @customrecipefields_decorator(Favorite, 'is_favorited')
     def get_is_favorited(self, instance):
         pass
 
-    @customrecipefields_decorator(ShoppingCart)
+    @customrecipefields_decorator(ShoppingCart, 'is_in_shopping_cart')
     def get_is_in_shopping_cart(self, instance):
         pass
 
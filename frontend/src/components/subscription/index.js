@@ -1,6 +1,7 @@
 import styles from './styles.module.css'
 import cn from 'classnames'
 import { Icons, Button, LinkComponent } from '../index'
+import { getImageUrl } from '../../utils'
 const countForm = (number, titles) => {
   number = Math.abs(number);
   if (Number.isInteger(number)) {
@@ -25,7 +26,7 @@ const Subscription = ({ email, first_name, last_name, username, removeSubscripti
           return <li className={styles.subscriptionItem} key={recipe.id}>
             <LinkComponent className={styles.subscriptionRecipeLink} href={`/recipes/${recipe.id}`} title={
               <div className={styles.subscriptionRecipe}>
-                <img src={recipe.image} alt={recipe.name} className={styles.subscriptionRecipeImage} />
+                <img src={getImageUrl(recipe)} alt={recipe.name} className={styles.subscriptionRecipeImage} />
                 <h3 className={styles.subscriptionRecipeTitle}>
                   {recipe.name}
                 </h3>
@@ -0,0 +1,7 @@
+// Уменьшенная копия картинки рецепта, пока ее нет - оригинал
+const getImageUrl = ({ image, images }, size = 'card') => {
+  const formats = (images && images[size]) || {}
+  return formats.webp || formats.jpeg || image
+}
+
+export default getImageUrl
@@ -1,4 +1,5 @@
 import hexToRgba from './hex-to-rgba'
+import getImageUrl from './get-image-url'
 import { useForm, useFormWithValidation } from './validation'
 import { useTags } from './use-tags'
 import useRecipes from './use-recipes'
@@ -7,6 +8,7 @@ import useSubscriptions from './use-subscriptions'
 
 export {
   hexToRgba,
+  getImageUrl,
   useForm,
   useFormWithValidation,
   useTags,